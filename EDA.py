@@ -1,8 +1,15 @@
 import streamlit as st
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from data_cleaning import load_and_clean_china, load_and_clean_us
+from data_cleaning import load_and_clean_china, load_and_clean_us, load_and_clean_hs, HS_CODES
 import pandas as pd
+import numpy as np
+from data_cache import shared_cache
+from trade_aggregates import RESOLUTIONS, PERIOD_FORMATS, PERIOD_MONTHS, store
+
+AGGREGATE_SCOPE = "All HS codes (aggregate)"
+# Sum of the tracked HS-code files, as opposed to the all-goods aggregate files
+COMBINED_HS_SCOPE = "Tracked HS codes combined"
 
 
 def plot_bar_chart(df, value_col, title, xlabel, top_n=3):
@@ -31,108 +38,163 @@ def plot_bar_chart(df, value_col, title, xlabel, top_n=3):
     return fig
 
 
-def show_trade_balance_charts():
-    df_china = load_and_clean_china()
-    df_us = load_and_clean_us()
-
-    def melt_and_prepare(df):
-        df_long = df.melt(id_vars="Partners", var_name="Year Month", value_name="Trade Balance")
-        df_long["Date"] = pd.to_datetime(df_long["Year Month"], format="%Y %B")
-        return df_long.sort_values("Date")
-
-    df_china_long = melt_and_prepare(df_china)
-    df_us_long = melt_and_prepare(df_us)
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.subheader("Trade Balance Over Time by Country (China)")
-        fig, ax = plt.subplots(figsize=(10, 6))
-        for partner in df_china_long["Partners"].unique():
-            country_data = df_china_long[df_china_long["Partners"] == partner]
-            ax.plot(country_data["Date"], country_data["Trade Balance"], label=partner)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+def load_scope(scope):
+    if scope == AGGREGATE_SCOPE:
+        return load_and_clean_china(), load_and_clean_us()
+    return load_and_clean_hs(scope, "CN"), load_and_clean_hs(scope, "US")
+
+
+def to_monthly_index(df):
+    # Partners x month matrix; columns are a sorted monthly PeriodIndex so any
+    # period can be looked up by position instead of scanning a melted frame
+    wide = df.set_index("Partners")
+    wide.columns = pd.PeriodIndex(pd.to_datetime(wide.columns, format="%Y %B"), freq="M")
+    return wide.sort_index(axis=1).astype(float)
+
+
+@shared_cache()
+def load_monthly_scope(scope):
+    if scope == COMBINED_HS_SCOPE:
+        by_hs = [load_monthly_scope(hs) for hs in HS_CODES]
+        return tuple(
+            pd.concat([wides[i] for wides in by_hs]).groupby(level=0).sum(min_count=1).sort_index(axis=1)
+            for i in (0, 1)
+        )
+    df_china, df_us = load_scope(scope)
+    return to_monthly_index(df_china), to_monthly_index(df_us)
+
+
+def load_trade_aggregates(scope):
+    # Quarterly/annual/trailing/YoY views, materialised once per monthly matrix (trade_aggregates.py)
+    wide_china, wide_us = load_monthly_scope(scope)
+    return store.refresh((scope, "CN"), wide_china), store.refresh((scope, "US"), wide_us)
+
+
+def reported_periods(wide):
+    # Months in which at least one partner has a value; the shared period index also holds
+    # months only the other reporter has, and all-NaN gaps inside a reporter's own range
+    return wide.columns[wide.notna().any(axis=0).to_numpy()]
+
+
+def compare_periods(wide, base, target):
+    base_label = base.strftime("%Y (%b)")
+    target_label = target.strftime("%Y (%b)")
+    base_pos, target_pos = wide.columns.get_indexer([base, target])
+    values = wide.to_numpy()
+    missing = np.full(len(wide), np.nan)
+
+    comparison = pd.DataFrame({
+        base_label: values[:, base_pos] if base_pos >= 0 else missing,
+        target_label: values[:, target_pos] if target_pos >= 0 else missing,
+    }, index=wide.index)
+    comparison["Absolute Change"] = comparison[target_label] - comparison[base_label]
+    comparison["% Change"] = (comparison["Absolute Change"] / comparison[base_label]) * 100
+    return comparison
+
+
+def show_reporter_panel(wide, aggregates, resolution, reporter, base, target):
+    st.subheader(f"Trade Balance Over Time by Country ({reporter}, {resolution})")
+    fig, ax = plt.subplots(figsize=(10, 6))
+    series = aggregates.frame(resolution)
+    # Quarters and years are plotted at their last month, where the sum is complete
+    dates = series.columns.to_timestamp(how="end").to_period("M").to_timestamp()
+    for partner, values in series.iterrows():
+        ax.plot(dates, values.to_numpy(), label=partner, marker="o" if resolution in PERIOD_MONTHS else None)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+    if resolution in PERIOD_MONTHS:
+        months = PERIOD_MONTHS[resolution]
+        ax.xaxis.set_major_locator(mdates.MonthLocator(bymonth=range(months, 13, months)))
+    else:
         ax.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Trade Balance")
-        ax.legend()
-        ax.grid(True)
-        plt.xticks(rotation=45)
-        st.pyplot(fig)
-
-        latest_date = df_china_long["Date"].max()
-        latest_data = df_china_long[df_china_long["Date"] == latest_date][["Partners", "Trade Balance"]].set_index("Partners")
-        st.markdown(f"**Latest Trade Balance (as of {latest_date.strftime('%b %Y')}):**")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Change vs same month last year" if resolution == "YoY change" else "Trade Balance")
+    ax.legend()
+    ax.grid(True)
+    plt.xticks(rotation=45)
+    st.pyplot(fig)
+    plt.close(fig)
+
+    reported = series.dropna(axis=1, how="all")
+    if reported.empty:
+        st.info(f"Not enough months reported for a {resolution.lower()} view.")
+    else:
+        latest_date = reported.columns[-1]
+        latest_data = reported.iloc[:, [-1]].set_axis(["Trade Balance"], axis=1)
+        st.markdown(f"**Latest Trade Balance ({resolution}, as of {latest_date.strftime(PERIOD_FORMATS[resolution])}):**")
         st.table(latest_data)
 
-        base = df_china_long[df_china_long["Year Month"] == "2020 June"].set_index("Partners")["Trade Balance"]
-        recent = df_china_long[df_china_long["Year Month"] == "2025 March"].set_index("Partners")["Trade Balance"]
-        comparison = pd.DataFrame({"2020 (Jun)": base, "2025 (Mar)": recent})
-        comparison["Absolute Change"] = comparison["2025 (Mar)"] - comparison["2020 (Jun)"]
-        comparison["% Change"] = (comparison["Absolute Change"] / comparison["2020 (Jun)"]) * 100
+    if base == target:
+        st.info("Select two different periods to compare.")
+        return
+    missing = [period for period in dict.fromkeys([base, target]) if period not in reported_periods(wide)]
+    if missing:
+        st.info(f"{reporter} has no trade data for {' or '.join(p.strftime('%B %Y') for p in missing)}. "
+                "Choose periods it reports to see the comparison.")
+        return
+
+    comparison = compare_periods(wide, base, target)
+    base_label, target_label = comparison.columns[:2]
+    period_text = f"{base.strftime('%Y %b')} vs {target.strftime('%Y %b')}"
+
+    st.markdown(f"### Trade Balance Change: {base.strftime('%B %Y')} vs {target.strftime('%B %Y')} ({reporter})")
+    st.dataframe(comparison.style.format({
+        base_label: "{:.2f}",
+        target_label: "{:.2f}",
+        "Absolute Change": "{:.2f}",
+        "% Change": "{:.2f}%"
+    }).background_gradient(cmap="RdYlGn", subset=["Absolute Change", "% Change"]))
+
+    st.markdown(f"#### \U0001F4CA Summary Stats ({reporter})")
+    st.metric("Mean Change", f"{comparison['Absolute Change'].mean():.2f}")
+    st.metric("Median Change", f"{comparison['Absolute Change'].median():.2f}")
+
+    st.markdown(f"**Visual: Absolute Change in Trade Balance ({reporter})**")
+    fig_abs = plot_bar_chart(comparison.dropna(subset=["Absolute Change"]), "Absolute Change", f"Absolute Change ({period_text})", "Change", top_n=3)
+    st.pyplot(fig_abs)
+    plt.close(fig_abs)
+
+    st.markdown(f"**Visual: Percentage Change in Trade Balance ({reporter})**")
+    fig_pct = plot_bar_chart(comparison.dropna(), "% Change", f"% Change ({period_text})", "% Change", top_n=3)
+    st.pyplot(fig_pct)
+    plt.close(fig_pct)
 
-        st.markdown("### Trade Balance Change: June 2020 vs March 2025 (China)")
-        st.dataframe(comparison.style.format({
-            "2020 (Jun)": "{:.2f}",
-            "2025 (Mar)": "{:.2f}",
-            "Absolute Change": "{:.2f}",
-            "% Change": "{:.2f}%"
-        }).background_gradient(cmap="RdYlGn", subset=["Absolute Change", "% Change"]))
 
-        st.markdown("#### \U0001F4CA Summary Stats (China)")
-        st.metric("Mean Change", f"{comparison['Absolute Change'].mean():.2f}")
-        st.metric("Median Change", f"{comparison['Absolute Change'].median():.2f}")
+def show_trade_balance_charts():
+    scope_col, resolution_col = st.columns(2)
+    with scope_col:
+        scope = st.selectbox(
+            "Product scope:",
+            [AGGREGATE_SCOPE, COMBINED_HS_SCOPE] + HS_CODES,
+            format_func=lambda s: s if isinstance(s, str) else f"HS Code {s}",
+            key="eda_scope"
+        )
+    with resolution_col:
+        resolution = st.selectbox("Resolution:", RESOLUTIONS, key="eda_resolution")
+
+    wide_china, wide_us = load_monthly_scope(scope)
+    agg_china, agg_us = load_trade_aggregates(scope)
+
+    # Positions into the shared monthly index; both reporters are looked up by period
+    periods = wide_china.columns.union(wide_us.columns)
+    period_positions = list(range(len(periods)))
+
+    sel1, sel2 = st.columns(2)
+    with sel1:
+        base_pos = st.selectbox(
+            "Base period:", period_positions, index=0,
+            format_func=lambda i: periods[i].strftime("%b %Y"), key="eda_base_period"
+        )
+    with sel2:
+        target_pos = st.selectbox(
+            "Target period:", period_positions, index=len(periods) - 1,
+            format_func=lambda i: periods[i].strftime("%b %Y"), key="eda_target_period"
+        )
+    base, target = periods[base_pos], periods[target_pos]
 
-        st.markdown("**Visual: Absolute Change in Trade Balance (China)**")
-        fig_abs = plot_bar_chart(comparison, "Absolute Change", "Absolute Change (2020 Jun vs 2025 Mar)", "Change", top_n=3)
-        st.pyplot(fig_abs)
+    col1, col2 = st.columns(2)
 
-        st.markdown("**Visual: Percentage Change in Trade Balance (China)**")
-        fig_pct = plot_bar_chart(comparison.dropna(), "% Change", "% Change (2020 Jun vs 2025 Mar)", "% Change", top_n=3)
-        st.pyplot(fig_pct)
+    with col1:
+        show_reporter_panel(wide_china, agg_china, resolution, "China", base, target)
 
     with col2:
-        st.subheader("Trade Balance Over Time by Country (US)")
-        fig, ax = plt.subplots(figsize=(10, 6))
-        for partner in df_us_long["Partners"].unique():
-            country_data = df_us_long[df_us_long["Partners"] == partner]
-            ax.plot(country_data["Date"], country_data["Trade Balance"], label=partner)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Trade Balance")
-        ax.legend()
-        ax.grid(True)
-        plt.xticks(rotation=45)
-        st.pyplot(fig)
-
-        latest_date_us = df_us_long["Date"].max()
-        latest_data_us = df_us_long[df_us_long["Date"] == latest_date_us][["Partners", "Trade Balance"]].set_index("Partners")
-        st.markdown(f"**Latest Trade Balance (as of {latest_date_us.strftime('%b %Y')}):**")
-        st.table(latest_data_us)
-
-        base_us = df_us_long[df_us_long["Year Month"] == "2020 June"].set_index("Partners")["Trade Balance"]
-        recent_us = df_us_long[df_us_long["Year Month"] == "2025 March"].set_index("Partners")["Trade Balance"]
-        comparison_us = pd.DataFrame({"2020 (Jun)": base_us, "2025 (Mar)": recent_us})
-        comparison_us["Absolute Change"] = comparison_us["2025 (Mar)"] - comparison_us["2020 (Jun)"]
-        comparison_us["% Change"] = (comparison_us["Absolute Change"] / comparison_us["2020 (Jun)"]) * 100
-
-        st.markdown("### Trade Balance Change: June 2020 vs March 2025 (US)")
-        st.dataframe(comparison_us.style.format({
-            "2020 (Jun)": "{:.2f}",
-            "2025 (Mar)": "{:.2f}",
-            "Absolute Change": "{:.2f}",
-            "% Change": "{:.2f}%"
-        }).background_gradient(cmap="RdYlGn", subset=["Absolute Change", "% Change"]))
-
-        st.markdown("#### \U0001F4CA Summary Stats (US)")
-        st.metric("Mean Change", f"{comparison_us['Absolute Change'].mean():.2f}")
-        st.metric("Median Change", f"{comparison_us['Absolute Change'].median():.2f}")
-
-        st.markdown("**Visual: Absolute Change in Trade Balance (US)**")
-        fig_abs_us = plot_bar_chart(comparison_us, "Absolute Change", "Absolute Change (2020 Jun vs 2025 Mar)", "Change", top_n=3)
-        st.pyplot(fig_abs_us)
-
-        st.markdown("**Visual: Percentage Change in Trade Balance (US)**")
-        fig_pct_us = plot_bar_chart(comparison_us.dropna(), "% Change", "% Change (2020 Jun vs 2025 Mar)", "% Change", top_n=3)
-        st.pyplot(fig_pct_us)
\ No newline at end of file
+        show_reporter_panel(wide_us, agg_us, resolution, "US", base, target)
@@ -3,6 +3,24 @@ from EDA import show_trade_balance_charts
 from product_analysis import plot_trade_balances
 from introduction_Q1 import display_project_scope_justification
 from sentiment import display_country_timeline_sentiment_dashboard
+from similarity import display_similarity_analysis
+from data_cache import cache, start_warm_up
+from prefetch import get_scheduler, schedule_prefetch
+from memory_profile import memory_report, start_tracing, stop_tracing, track_section, tracker
+from report_builder import DASHBOARD_PAGES, BUNDLE_PAGE_HEIGHT, load_bundle_page
+import streamlit.components.v1 as components
+import pandas as pd
+import os
+import tracemalloc
+import uuid
+
+# Set to a directory built by report_builder.py to serve pre-rendered pages with no compute
+REPORT_BUNDLE_DIR = os.environ.get("WIF3009_REPORT_BUNDLE")
+
+# Preload every dataset into the shared cache once per server process
+if not REPORT_BUNDLE_DIR:
+    start_warm_up()
+
 st.title("Impact Analysis of US-China Tariffs")
 
 if "section" not in st.session_state:
@@ -28,25 +46,77 @@ with st.sidebar:
     if st.button("Conclusion & Recommendations"):
         set_section("Conclusion & Recommendations")
 
+def display_cache_admin():
+    stats = cache.stats()
+    st.markdown("## Cache Admin")
+    st.metric("Hit Rate", f"{stats['hit_rate']:.1%}")
+    st.write(f"**Hits:** {stats['hits']} | **Misses:** {stats['misses']}")
+    st.write(f"**Evictions:** {stats['evictions']} | **Expired:** {stats['expirations']}")
+    st.write(f"**Memory:** {stats['bytes'] / 1024 ** 2:.1f} / {stats['max_bytes'] / 1024 ** 2:.0f} MB in {stats['entries']} entries")
+    prefetch = get_scheduler().stats()
+    st.write(f"**Prefetch:** {prefetch['queued']} queued, {prefetch['running']} running, "
+             f"{prefetch['completed']} done, {prefetch['cancelled']} cancelled, {prefetch['failed']} failed")
+    entries = cache.entries()
+    if entries:
+        st.dataframe(pd.DataFrame(entries), use_container_width=True)
+    if st.button("Clear Cache"):
+        cache.clear()
+
+def display_memory_admin():
+    report = memory_report()
+    st.markdown("## Memory")
+    tracing = st.checkbox("Trace allocations (tracemalloc)", value=tracemalloc.is_tracing(), key="admin_memory_trace")
+    if tracing and not tracemalloc.is_tracing():
+        start_tracing()
+    elif not tracing and tracemalloc.is_tracing():
+        stop_tracing()
+    if report["traced_bytes"] is not None:
+        st.write(f"**Traced:** {report['traced_bytes'] / 1024 ** 2:.1f} MB")
+    st.write(f"**Open figures:** {len(report['figures'])} (~{report['figure_bytes'] / 1024 ** 2:.1f} MB of canvas)")
+    if report["sections"]:
+        st.markdown("**Sections** (time per run, traced memory and growth since the previous run)")
+        st.dataframe(pd.DataFrame(report["sections"]), use_container_width=True)
+        growth = tracker.top_growth(section)
+        if growth:
+            st.markdown(f"**Top growth in {section}**")
+            st.dataframe(pd.DataFrame(growth), use_container_width=True)
+    if len(report["cache"]):
+        st.markdown("**Cache by dataset/figure**")
+        st.dataframe(report["cache"], use_container_width=True)
+
 section = st.session_state.section
 
+# Open the app with ?admin=1 to see the shared cache counters and memory accounting
+if "admin" in st.query_params:
+    with st.sidebar:
+        display_cache_admin()
+        display_memory_admin()
+
 st.write(f"### {section}")
 
-def display_correlation_analysis():
-    st.write("Content about correlation analysis...")
-
-if section == "Data Collection & Cleaning":
-    display_project_scope_justification()
-elif section == "Exploratory Data Analysis":
-    show_trade_balance_charts()
-    plot_trade_balances()
-elif section == "Sentiment Analysis":
-    display_country_timeline_sentiment_dashboard()
-elif section == "Correlation Analysis":
-    display_correlation_analysis()
-elif section == "Predictive Modeling":
-    st.write("Content about predictive modeling...")
-elif section == "Visualization of Findings":
-    st.write("Content about visualization...")
-elif section == "Conclusion & Recommendations":
-    st.write("Content about conclusions and recommendations...")
+# Timing (and allocations, while tracing) is recorded per section and logged
+with track_section(section):
+    if REPORT_BUNDLE_DIR and section in DASHBOARD_PAGES:
+        for slug in DASHBOARD_PAGES[section]:
+            components.html(load_bundle_page(REPORT_BUNDLE_DIR, slug), height=BUNDLE_PAGE_HEIGHT, scrolling=True)
+    elif section == "Data Collection & Cleaning":
+        display_project_scope_justification()
+    elif section == "Exploratory Data Analysis":
+        show_trade_balance_charts()
+        plot_trade_balances()
+    elif section == "Sentiment Analysis":
+        display_country_timeline_sentiment_dashboard()
+    elif section == "Correlation Analysis":
+        display_similarity_analysis()
+    elif section == "Predictive Modeling":
+        st.write("Content about predictive modeling...")
+    elif section == "Visualization of Findings":
+        st.write("Content about visualization...")
+    elif section == "Conclusion & Recommendations":
+        st.write("Content about conclusions and recommendations...")
+
+# The section above has been sent to the browser; load the other sections in the background
+if not REPORT_BUNDLE_DIR:
+    if "prefetch_session" not in st.session_state:
+        st.session_state.prefetch_session = uuid.uuid4().hex
+    schedule_prefetch(st.session_state.prefetch_session, section)
@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import threading
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Process-wide cache shared by every Streamlit session on this server.
+# Cached values are shared between sessions, so callers must treat them as read-only
+# (take a .copy() before mutating a cached DataFrame).
+DEFAULT_TTL_SECONDS = int(os.environ.get("WIF3009_CACHE_TTL_SECONDS", 6 * 60 * 60))
+MAX_CACHE_BYTES = int(os.environ.get("WIF3009_CACHE_MAX_MB", 512)) * 1024 * 1024
+
+
+def estimate_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    if hasattr(value, "__dict__") and not isinstance(value, type):
+        # Plain objects holding frames, e.g. sentiment_chunked.ChunkedSentimentSource
+        return sys.getsizeof(value) + estimate_bytes(vars(value))
+    return sys.getsizeof(value)
+
+
+def entry_name(key):
+    # Keys start with (module, function or figure name, ...); group entries by that prefix
+    if isinstance(key, tuple) and len(key) >= 2:
+        return f"{key[0]}.{key[1]}"
+    return repr(key)
+
+
+class SharedCache:
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, default_ttl=DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at), oldest use first
+        self._lock = threading.RLock()
+        self._key_locks = {}  # key -> [lock, threads holding or waiting on it]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.current_bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value, ttl=None):
+        size = estimate_bytes(value)
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                # Never let a single oversized value flush the whole cache
+                return value
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self.current_bytes += size
+        return value
+
+    def get_or_load(self, key, loader, ttl=None):
+        found, value = self.get(key)
+        if found:
+            return value
+        # One loader per key: concurrent sessions asking for the same dataset wait
+        # for the first download instead of all fetching it at once
+        # The lock stays registered while any thread holds or waits on it, so callers arriving
+        # after a failed load queue behind the retry instead of starting their own
+        with self._lock:
+            slot = self._key_locks.get(key)
+            if slot is None:
+                slot = self._key_locks[key] = [threading.Lock(), 0]
+            slot[1] += 1
+        try:
+            with slot[0]:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry[2] >= time.monotonic():
+                        # Another thread loaded it while this one waited: a hit after all
+                        self._entries.move_to_end(key)
+                        self.misses -= 1
+                        self.hits += 1
+                        return entry[0]
+                value = loader()
+                self.put(key, value, ttl)
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0 and self._key_locks.get(key) is slot:
+                    del self._key_locks[key]
+        return value
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def entries(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"name": entry_name(key), "key": repr(key), "bytes": size, "expires_in_s": round(expires_at - now, 1)}
+                for key, (_, size, expires_at) in self._entries.items()
+            ]
+
+
+cache = SharedCache()
+
+
+def shared_cache(ttl=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            return cache.get_or_load(key, lambda: func(*args, **kwargs), ttl)
+        return wrapper
+    return decorator
+
+
+# === WARM-UP ===
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def dataset_loaders():
+    from data_cleaning import load_and_clean_china, load_and_clean_us, load_and_clean_hs, HS_CODES
+    from EDA import load_trade_aggregates, AGGREGATE_SCOPE, COMBINED_HS_SCOPE
+    from sentiment import load_sentiment_source
+
+    loaders = [load_and_clean_china, load_and_clean_us, load_sentiment_source]
+    loaders += [functools.partial(load_and_clean_hs, hs, reporter) for hs in HS_CODES for reporter in ("CN", "US")]
+    # Per-HS scopes first: the combined scope sums them
+    loaders += [functools.partial(load_trade_aggregates, scope) for scope in HS_CODES + [AGGREGATE_SCOPE, COMBINED_HS_SCOPE]]
+    return loaders
+
+
+def warm_up(max_workers=8):
+    # Downloads are I/O bound, so a thread pool cuts cold-start time roughly by the pool size
+    failures = []
+
+    def run(loader):
+        try:
+            loader()
+        except Exception as e:
+            failures.append((loader, e))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(run, dataset_loaders()))
+    return failures
+
+
+def start_warm_up():
+    # Called on every script run; only the first call in the server process starts the thread
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, name="data-cache-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    failed = warm_up()
+    print(f"Warmed {cache.stats()['entries']} entries in {time.perf_counter() - start:.1f}s")
+    for loader, error in failed:
+        print(f"Failed: {loader}: {error}")
@@ -1,5 +1,9 @@
 import pandas as pd
 import re
+from data_cache import shared_cache
+
+DATA_BASE_URL = "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main"
+HS_CODES = [12, 39, 84, 85, 87, 90, 94]
 
 month_map = {
     "M01": "January", "M02": "February", "M03": "March", "M04": "April",
@@ -18,12 +22,21 @@ def rename_col(col):
         return f"{year} {month_name}"
     return col
 
+@shared_cache()
 def load_and_clean_china():
-    df = pd.read_csv("https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_trade_balance_China.csv")
+    df = pd.read_csv(f"{DATA_BASE_URL}/combined_trade_balance_China.csv")
     df.columns = [rename_col(c) for c in df.columns]
     return df
 
+@shared_cache()
 def load_and_clean_us():
-    df = pd.read_csv("https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_trade_balance_US.csv")
+    df = pd.read_csv(f"{DATA_BASE_URL}/combined_trade_balance_US.csv")
+    df.columns = [rename_col(c) for c in df.columns]
+    return df
+
+@shared_cache()
+def load_and_clean_hs(hs_code, reporter):
+    # reporter is "CN" or "US", matching the combined_{HS}_{reporter}.csv files
+    df = pd.read_csv(f"{DATA_BASE_URL}/combined_{hs_code}_{reporter}.csv")
     df.columns = [rename_col(c) for c in df.columns]
     return df
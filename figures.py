@@ -0,0 +1,109 @@
+# figures.py
+# Plotly helpers that keep the figures sent to the browser small.
+#
+# - Box plots are drawn from precomputed quartiles, whiskers and a sample of outliers, so the
+#   payload grows with the number of groups rather than the number of rows.
+# - Line/scatter traces switch to WebGL (scattergl) once a figure has more points than
+#   WEBGL_POINT_THRESHOLD; SVG traces get slow to draw and pan well before that.
+# - Built figures are kept as JSON in the shared cache, keyed by a hash of the input frame,
+#   so reruns and other sessions skip the plotly.express build for the same data.
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from data_cache import cache
+
+WEBGL_POINT_THRESHOLD = 1000
+MAX_BOX_OUTLIERS = 200
+FIGURE_TTL_SECONDS = 60 * 60
+
+
+# === TRACE SELECTION ===
+def use_webgl(n_points):
+    return n_points > WEBGL_POINT_THRESHOLD
+
+
+def scatter_trace(n_points, **kwargs):
+    # scattergl has no spline shape, so fall back to straight segments with it
+    if use_webgl(n_points):
+        if kwargs.get('line', {}).get('shape') == 'spline':
+            kwargs['line'] = {**kwargs['line'], 'shape': 'linear'}
+        return go.Scattergl(**kwargs)
+    return go.Scatter(**kwargs)
+
+
+def line_options(n_points, line_shape='spline'):
+    # Keyword arguments for px.line: SVG spline for small figures, WebGL above the threshold
+    if use_webgl(n_points):
+        return {'render_mode': 'webgl', 'line_shape': 'linear'}
+    return {'render_mode': 'svg', 'line_shape': line_shape}
+
+
+# === BOX PLOTS ===
+def box_summary(df, group_col, value_col, max_outliers=MAX_BOX_OUTLIERS, seed=0):
+    # Tukey boxes with linear-interpolated quartiles, matching plotly's default quartilemethod
+    data = df[[group_col, value_col]].dropna()
+    grouped = data.groupby(group_col, sort=False)[value_col]
+    summary = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    summary.columns = ['q1', 'median', 'q3']
+    iqr = summary['q3'] - summary['q1']
+    summary['low_limit'] = summary['q1'] - 1.5 * iqr
+    summary['high_limit'] = summary['q3'] + 1.5 * iqr
+    summary['count'] = grouped.size()
+
+    # Whiskers end at the most extreme points still inside the 1.5 * IQR limits
+    limits = summary.loc[data[group_col], ['low_limit', 'high_limit']].to_numpy()
+    values = data[value_col].to_numpy()
+    inside = (values >= limits[:, 0]) & (values <= limits[:, 1])
+    within = data[inside].groupby(group_col, sort=False)[value_col]
+    summary['lowerfence'] = within.min()
+    summary['upperfence'] = within.max()
+
+    outliers = data[~inside]
+    if len(outliers) > max_outliers:
+        # Keep the extremes of each group and a random sample of the rest
+        extremes = outliers.groupby(group_col, sort=False)[value_col].agg(['idxmin', 'idxmax']).stack().unique()
+        rest = outliers.drop(index=extremes)
+        n_sample = max(max_outliers - len(extremes), 0)
+        sample = rest.sample(n=min(n_sample, len(rest)), random_state=seed)
+        outliers = outliers.loc[np.concatenate([extremes, sample.index.to_numpy()])]
+    return summary.drop(columns=['low_limit', 'high_limit']), outliers
+
+
+def box_figure(summary, outliers, group_col, value_col, color_map=None, title=None):
+    color_map = color_map or {}
+    fig = go.Figure()
+    for group, row in summary.iterrows():
+        color = color_map.get(group)
+        fig.add_trace(go.Box(
+            name=str(group), x=[group], q1=[row['q1']], median=[row['median']], q3=[row['q3']],
+            lowerfence=[row['lowerfence']], upperfence=[row['upperfence']],
+            boxpoints=False, marker_color=color, legendgroup=str(group),
+        ))
+        points = outliers.loc[outliers[group_col] == group, value_col]
+        if len(points):
+            fig.add_trace(scatter_trace(
+                len(outliers), x=[group] * len(points), y=points.to_numpy(), mode='markers',
+                marker=dict(color=color, size=4), name=str(group), legendgroup=str(group),
+                showlegend=False, hovertemplate=f"{value_col}: %{{y:.3f}}<extra>{group}</extra>",
+            ))
+    fig.update_layout(title=title, xaxis_title=group_col, yaxis_title=value_col, legend_title_text=group_col)
+    return fig
+
+
+# === CACHED FIGURES ===
+def frame_digest(df):
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    columns = json.dumps([str(c) for c in df.columns]).encode('utf-8')
+    return hashlib.sha1(hashes.tobytes() + columns).hexdigest()
+
+
+def cached_figure(name, data, build, **params):
+    # build(data, **params) -> go.Figure; the figure JSON is cached per (name, data hash, params)
+    key = ('figures', name, frame_digest(data), tuple(sorted(params.items())))
+    figure_json = cache.get_or_load(key, lambda: build(data, **params).to_json(), FIGURE_TTL_SECONDS)
+    return pio.from_json(figure_json, skip_invalid=True)
@@ -0,0 +1,240 @@
+# memory_profile.py
+# Per-section timing and memory accounting, and a rerun regression check.
+#
+# dashboard.py wraps each section render in track_section(). Every run records the wall time;
+# while tracing is on (WIF3009_MEMORY_TRACE=1, or switched on from the ?admin=1 panel) it also
+# takes a tracemalloc snapshot and diffs it against the previous run of the same section, so
+# memory that survives reruns shows up by source line. memory_report() breaks down what the
+# process holds: shared cache entries grouped by loader/figure name, and open matplotlib figures.
+#
+# Regression check, rendering sections headlessly through report_builder's recorder:
+#   python memory_profile.py --sections sentiment_dashboard --reruns 5 --max-growth-mb 8
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+from streamlit.logger import get_logger
+
+from data_cache import cache
+
+# Streamlit's logger factory attaches its console handler and follows the server's
+# logger.level setting (info by default), so the per-section lines reach the server log
+logger = get_logger(__name__)
+
+MEMORY_TRACE = os.environ.get("WIF3009_MEMORY_TRACE") == "1"
+TRACE_FRAMES = 1
+TOP_ALLOCATIONS = 10
+WARM_UP_RUNS = 2
+DEFAULT_RERUNS = 5
+DEFAULT_MAX_GROWTH_MB = 8
+# Allocations made by the profiler itself are left out of every snapshot
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def start_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+
+
+def stop_tracing():
+    tracemalloc.stop()
+    tracker.forget_snapshots()
+
+
+def take_snapshot():
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def top_growth(snapshot, previous, limit=TOP_ALLOCATIONS):
+    stats = [s for s in snapshot.compare_to(previous, "lineno") if s.size_diff > 0][:limit]
+    return [
+        {"where": str(s.traceback), "size_diff": s.size_diff, "count_diff": s.count_diff, "size": s.size}
+        for s in stats
+    ]
+
+
+class SectionMemoryTracker:
+    # tracemalloc is process-wide: with several sessions rendering at once, a section's diff
+    # also contains whatever the other sessions allocated in the meantime
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = {}      # section -> run count, timings and traced bytes
+        self._snapshots = {}    # section -> snapshot taken after its previous run
+
+    @contextmanager
+    def track(self, section):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(section, time.perf_counter() - start)
+
+    def _record(self, section, seconds):
+        snapshot = take_snapshot() if tracemalloc.is_tracing() else None
+        with self._lock:
+            record = self._records.setdefault(section, {"runs": 0, "total_seconds": 0.0})
+            record["runs"] += 1
+            record["total_seconds"] += seconds
+            record["last_seconds"] = seconds
+            if snapshot is None:
+                logger.info("Section %r rendered in %.2fs", section, seconds)
+                return
+            traced = sum(stat.size for stat in snapshot.statistics("filename"))
+            previous = self._snapshots.get(section)
+            growth = traced - record["traced_bytes"] if previous is not None else 0
+            record["traced_bytes"] = traced
+            record["growth_bytes"] = growth
+            record["top_growth"] = top_growth(snapshot, previous) if previous is not None else []
+            self._snapshots[section] = snapshot
+        logger.info("Section %r rendered in %.2fs; traced %.1f MB (%+.2f MB since its last run)",
+                    section, seconds, traced / 1024 ** 2, growth / 1024 ** 2)
+        for row in record["top_growth"][:3]:
+            logger.info("  %+.1f KB at %s", row["size_diff"] / 1024, row["where"])
+
+    def sections(self):
+        with self._lock:
+            return [
+                {
+                    "section": section,
+                    "runs": r["runs"],
+                    "last_s": round(r["last_seconds"], 3),
+                    "avg_s": round(r["total_seconds"] / r["runs"], 3),
+                    "traced_mb": round(r["traced_bytes"] / 1024 ** 2, 2) if "traced_bytes" in r else None,
+                    "growth_mb": round(r["growth_bytes"] / 1024 ** 2, 3) if "growth_bytes" in r else None,
+                }
+                for section, r in self._records.items()
+            ]
+
+    def top_growth(self, section):
+        with self._lock:
+            return list(self._records.get(section, {}).get("top_growth", []))
+
+    def forget_snapshots(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+tracker = SectionMemoryTracker()
+
+
+def track_section(section):
+    return tracker.track(section)
+
+
+# === HELD MEMORY ===
+def cache_breakdown():
+    entries = pd.DataFrame(cache.entries(), columns=["name", "key", "bytes", "expires_in_s"])
+    breakdown = entries.groupby("name").agg(entries=("key", "size"), bytes=("bytes", "sum"))
+    return breakdown.sort_values("bytes", ascending=False)
+
+
+def open_figures():
+    # Figures still registered with pyplot are never freed until plt.close(); each holds its
+    # Agg canvas buffer (width x height x RGBA) once drawn
+    if "matplotlib.pyplot" not in sys.modules:
+        return pd.DataFrame(columns=["figure", "size_px", "artists", "canvas_bytes"])
+    from matplotlib._pylab_helpers import Gcf
+
+    rows = []
+    for manager in Gcf.get_all_fig_managers():
+        fig = manager.canvas.figure
+        width, height = fig.get_size_inches() * fig.dpi
+        rows.append({
+            "figure": manager.num,
+            "size_px": f"{int(width)}x{int(height)}",
+            "artists": len(fig.findobj()),
+            "canvas_bytes": int(width) * int(height) * 4,
+        })
+    return pd.DataFrame(rows, columns=["figure", "size_px", "artists", "canvas_bytes"])
+
+
+def memory_report():
+    figures = open_figures()
+    return {
+        "cache": cache_breakdown(),
+        "figures": figures,
+        "figure_bytes": int(figures["canvas_bytes"].sum()),
+        "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        "sections": tracker.sections(),
+    }
+
+
+# === RERUN REGRESSION CHECK ===
+def figure_numbers():
+    if "matplotlib.pyplot" not in sys.modules:
+        return set()
+    import matplotlib.pyplot as plt
+    return set(plt.get_fignums())
+
+
+def close_figures(numbers):
+    if numbers:
+        import matplotlib.pyplot as plt
+        for number in numbers:
+            plt.close(number)
+
+
+def rerun_growth(slug, reruns, out_dir):
+    # Growth of traced memory and open figures over `reruns` renders after the caches are warm.
+    # The recorder normally closes every figure it saves; here it leaves them open, so a section
+    # that forgets plt.close() shows up as figures left behind
+    from report_builder import render_section
+
+    existing = figure_numbers()
+    for _ in range(WARM_UP_RUNS):
+        render_section(slug, out_dir, close_figures=False)
+    close_figures(figure_numbers() - existing)
+    before = take_snapshot()
+    for _ in range(reruns):
+        render_section(slug, out_dir, close_figures=False)
+    after = take_snapshot()
+    leaked = figure_numbers() - existing
+    close_figures(leaked)
+    growth = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    return growth, len(leaked), top_growth(after, before)
+
+
+def main():
+    from report_builder import REPORT_SECTIONS
+
+    parser = argparse.ArgumentParser(description="Fail if re-rendering a section keeps growing memory.")
+    parser.add_argument("--sections", nargs="*", choices=list(REPORT_SECTIONS), help="sections to check (default: all)")
+    parser.add_argument("--reruns", type=int, default=DEFAULT_RERUNS, help="renders measured after warm-up")
+    parser.add_argument("--max-growth-mb", type=float, default=DEFAULT_MAX_GROWTH_MB,
+                        help="allowed traced-memory growth across all measured reruns")
+    args = parser.parse_args()
+
+    start_tracing()
+    failed = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for slug in args.sections or REPORT_SECTIONS:
+            growth, leaked_figures, top = rerun_growth(slug, args.reruns, out_dir)
+            ok = growth <= args.max_growth_mb * 1024 ** 2 and leaked_figures == 0
+            print(f"{'ok  ' if ok else 'FAIL'} {slug}: {growth / 1024 ** 2:+.2f} MB over {args.reruns} reruns, "
+                  f"{leaked_figures} figures left open")
+            if not ok:
+                failed.append(slug)
+                for row in top[:5]:
+                    print(f"       {row['size_diff'] / 1024:+.1f} KB at {row['where']}")
+    sys.exit(1 if failed else 0)
+
+
+if MEMORY_TRACE:
+    start_tracing()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# prefetch.py
+# Background prefetch of the data behind the dashboard sections the user has not opened yet.
+#
+# dashboard.py calls schedule_prefetch() as the last step of each script run, after the
+# current section has been sent to the browser. Loads go through the @shared_cache loaders,
+# so a prefetched section renders from the shared cache on its first click.
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+NAVIGATION_ORDER = [
+    "Data Collection & Cleaning",
+    "Exploratory Data Analysis",
+    "Sentiment Analysis",
+    "Correlation Analysis",
+    "Predictive Modeling",
+    "Visualization of Findings",
+    "Conclusion & Recommendations",
+]
+PREFETCH_WORKERS = 2
+# Sessions that have not navigated for this long are treated as closed and their requests dropped
+SESSION_IDLE_SECONDS = 30 * 60
+
+
+def section_tasks(section):
+    # (key, loader) pairs for everything a section reads, most important first
+    if section == "Exploratory Data Analysis":
+        from data_cleaning import HS_CODES
+        from EDA import AGGREGATE_SCOPE, COMBINED_HS_SCOPE, load_trade_aggregates
+        from product_analysis import load_trade_findings
+
+        tasks = [(("EDA", AGGREGATE_SCOPE), lambda: load_trade_aggregates(AGGREGATE_SCOPE))]
+        tasks += [(("EDA", hs), lambda hs=hs: load_trade_aggregates(hs)) for hs in HS_CODES]
+        tasks += [(("EDA", COMBINED_HS_SCOPE), lambda: load_trade_aggregates(COMBINED_HS_SCOPE))]
+        tasks += [(("product_analysis", "findings"), load_trade_findings)]
+        return tasks
+    if section == "Sentiment Analysis":
+        from sentiment import (load_sentiment_source, load_timeline_data, load_country_stats, default_countries,
+                               load_sentiment_findings)
+
+        def default_rollups():
+            countries = tuple(default_countries(load_sentiment_source().country_counts()))
+            load_timeline_data(countries, "Monthly")
+            load_country_stats(countries)
+
+        return [(("sentiment", "source"), load_sentiment_source), (("sentiment", "default_rollups"), default_rollups),
+                (("sentiment", "findings"), load_sentiment_findings)]
+    if section == "Correlation Analysis":
+        from similarity import SIMILARITY_RESOLUTIONS, METRICS, load_similarity
+
+        return [(("similarity", SIMILARITY_RESOLUTIONS[0], METRICS[0]),
+                 lambda: load_similarity(SIMILARITY_RESOLUTIONS[0], METRICS[0]))]
+    return []
+
+
+class PrefetchScheduler:
+    """Priority queue of prefetch loads shared by every session in the server process.
+
+    Each session's latest navigation replaces its earlier requests: queued loads nobody
+    else wants are dropped, and the rest are re-ranked by distance from the new section.
+    Loads that are already running are left to finish, since their results are cached.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self._heap = []                 # (priority, seq, key); stale entries are skipped on pop
+        self._tasks = {}                # key -> {"loader", "priority", "sessions", "running"}
+        self._session_keys = {}         # session id -> keys it asked for
+        self._last_seen = {}            # session id -> monotonic time of its last schedule()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True).start()
+
+    def schedule(self, session_id, tasks):
+        with self._cond:
+            now = time.monotonic()
+            self._prune_sessions(now)
+            self._last_seen[session_id] = now
+            wanted = {key for key, _ in tasks}
+            for key in self._session_keys.pop(session_id, set()) - wanted:
+                self._release(session_id, key)
+            for priority, (key, loader) in enumerate(tasks):
+                task = self._tasks.get(key)
+                if task is None:
+                    task = {"loader": loader, "priority": None, "sessions": set(), "running": False}
+                    self._tasks[key] = task
+                task["sessions"].add(session_id)
+                if task["running"]:
+                    continue
+                # Another session may still want this load sooner than we do
+                if task["priority"] is not None and task["sessions"] != {session_id}:
+                    priority = min(priority, task["priority"])
+                if priority != task["priority"]:
+                    task["priority"] = priority
+                    heapq.heappush(self._heap, (priority, next(self._seq), key))
+            self._session_keys[session_id] = wanted
+            self._cond.notify_all()
+
+    def _prune_sessions(self, now):
+        # Streamlit does not tell us when a session ends, so idle sessions are expired here
+        for session_id, seen in list(self._last_seen.items()):
+            if now - seen > SESSION_IDLE_SECONDS:
+                del self._last_seen[session_id]
+                for key in self._session_keys.pop(session_id, set()):
+                    self._release(session_id, key)
+
+    def _release(self, session_id, key):
+        task = self._tasks.get(key)
+        if task is None or task["running"]:
+            return
+        task["sessions"].discard(session_id)
+        if not task["sessions"]:
+            del self._tasks[key]
+            self.cancelled += 1
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                while not self._heap:
+                    self._cond.wait()
+                priority, _, key = heapq.heappop(self._heap)
+                task = self._tasks.get(key)
+                # Cancelled, already picked up, or superseded by a higher-priority entry
+                if task is None or task["running"] or task["priority"] != priority:
+                    continue
+                task["running"] = True
+                return key, task
+
+    def _work(self):
+        while True:
+            key, task = self._next_task()
+            try:
+                task["loader"]()
+                outcome = "completed"
+            except Exception:
+                logger.exception("Prefetch of %s failed", key)
+                outcome = "failed"
+            with self._cond:
+                self._tasks.pop(key, None)
+                setattr(self, outcome, getattr(self, outcome) + 1)
+                for keys in self._session_keys.values():
+                    keys.discard(key)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": sum(not t["running"] for t in self._tasks.values()),
+                "running": sum(t["running"] for t in self._tasks.values()),
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "failed": self.failed,
+                "sessions": len(self._session_keys),
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrefetchScheduler()
+    return _scheduler
+
+
+def schedule_prefetch(session_id, current_section):
+    # Nearest sections in the sidebar first: they are the likeliest next clicks
+    current = NAVIGATION_ORDER.index(current_section) if current_section in NAVIGATION_ORDER else 0
+    others = sorted((s for s in NAVIGATION_ORDER if s != current_section),
+                    key=lambda s: abs(NAVIGATION_ORDER.index(s) - current))
+    tasks = [task for section in others for task in section_tasks(section)]
+    get_scheduler().schedule(session_id, tasks)
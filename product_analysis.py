@@ -3,23 +3,11 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import streamlit as st
-
-CSV_SOURCE_FILES = [
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_12_CN.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_12_US.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_39_CN.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_39_US.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_84_CN.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_84_US.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_85_CN.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_85_US.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_87_CN.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_87_US.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_90_CN.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_90_US.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_94_CN.csv",
-    "https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/combined_94_US.csv",
-]
+from data_cache import shared_cache
+from data_cleaning import HS_CODES
+from detection import detect
+from EDA import COMBINED_HS_SCOPE, load_monthly_scope, load_trade_aggregates
+from trade_aggregates import RESOLUTIONS
 
 CUSTOM_TITLES = {
     "combined_12_CN": "Trade Balance of *HS Code 12 (Seed, fruit and other grains)* - China Towards Other Countries",
@@ -38,63 +26,156 @@ CUSTOM_TITLES = {
     "combined_94_US": "Trade Balance of *HS Code 94 (Furniture and Lighting)* - US Towards Other Countries",
 }
 
+HS_NAMES = {
+    12: "Seed, fruit and other grains",
+    39: "Plastics and articles thereof",
+    84: "Machinery & Boilers",
+    85: "Electrical Machinery",
+    87: "Vehicles excluding rail",
+    90: "Precision Instruments",
+    94: "Furniture and Lighting",
+}
+REPORTER_NAMES = {"CN": "China", "US": "United States"}
+SUMMARY_TOP_FINDINGS = 5
+
+@shared_cache()
+def load_trade_findings():
+    # Level shifts and unusual months for every (HS code, reporter, partner) monthly series
+    frames = {}
+    for hs in HS_CODES:
+        for reporter, wide in zip(("CN", "US"), load_monthly_scope(hs)):
+            frames[(hs, reporter)] = wide
+    return detect(pd.concat(frames, names=["hs", "reporter", "partner"]))
+
+def findings_for(findings, hs, reporter):
+    # Rows of a findings frame for one file, with the partner split out of the series key
+    selected = findings[findings["series"].map(lambda key: key[:2] == (hs, reporter)).astype(bool)].copy()
+    selected["partner"] = [key[2] for key in selected["series"]]
+    selected["date"] = pd.PeriodIndex(selected["period"], freq="M").to_timestamp()
+    return selected
+
+def latest_trailing_totals(reporter):
+    # Trailing-12-month balance per HS code, all tracked partners combined, at the latest complete window
+    totals, as_of = {}, None
+    for hs in HS_CODES:
+        trailing = load_trade_aggregates(hs)[0 if reporter == "CN" else 1].frame("Trailing 12M")
+        reported = trailing.dropna(axis=1, how="all")
+        if reported.empty:
+            continue
+        totals[hs] = reported.iloc[:, -1].sum()
+        as_of = reported.columns[-1] if as_of is None else min(as_of, reported.columns[-1])
+    return pd.Series(totals, dtype=float), as_of
+
+def trade_summary_markdown(change_points, anomalies):
+    # Generated from the stored aggregates and detection findings, so it follows the data
+    lines = []
+    surpluses = {}
+    for reporter, icon in (("CN", "🟢"), ("US", "🔵")):
+        name = REPORTER_NAMES[reporter]
+        totals, as_of = latest_trailing_totals(reporter)
+        surpluses[name] = totals
+        lines.append(f"### {icon} {name}")
+        if as_of is not None:
+            window = f"12 months to {as_of.strftime('%b %Y')}"
+            for label, selected in (("Positive", totals[totals > 0].sort_values(ascending=False)),
+                                    ("Negative", totals[totals < 0].sort_values())):
+                if len(selected):
+                    lines.append(f"- **{label} trade balances** ({window}, tracked partners combined) in:")
+                    lines += [f"  - HS {hs}: {HS_NAMES.get(hs, '')} ({value:,.0f})" for hs, value in selected.items()]
+
+        ours = change_points[change_points["series"].map(lambda key: key[1] == reporter).astype(bool)]
+        ours = ours.reindex(ours["shift_sigma"].abs().sort_values(ascending=False).index).head(SUMMARY_TOP_FINDINGS)
+        if len(ours):
+            lines.append("- **Largest level shifts:**")
+            lines += [
+                f"  - HS {hs} with {partner} from **{row['period'].strftime('%b %Y')}**: "
+                f"{row['before']:,.0f} → {row['after']:,.0f} per month"
+                for (hs, _, partner), (_, row) in zip(ours["series"], ours.iterrows())
+            ]
+        unusual = anomalies[anomalies["series"].map(lambda key: key[1] == reporter).astype(bool)]
+        unusual = unusual.reindex(unusual["z"].abs().sort_values(ascending=False).index).head(SUMMARY_TOP_FINDINGS)
+        if len(unusual):
+            lines.append("- **Unusual months:**")
+            lines += [
+                f"  - HS {hs} with {partner} in **{row['period'].strftime('%b %Y')}**: {row['value']:,.0f} (robust z = {row['z']:.1f})"
+                for (hs, _, partner), (_, row) in zip(unusual["series"], unusual.iterrows())
+            ]
+        lines.append("")
+
+    lines += ["---", "", "### ✅ Conclusion:"]
+    for name, totals in surpluses.items():
+        if len(totals):
+            lines.append(f"- **{name}** runs a surplus in **{(totals > 0).sum()} of {len(totals)}** tracked HS codes; "
+                         f"largest in HS {totals.idxmax()} ({HS_NAMES.get(totals.idxmax(), '')}), "
+                         f"weakest in HS {totals.idxmin()} ({HS_NAMES.get(totals.idxmin(), '')}).")
+    lines.append(f"- {len(change_points)} level shifts and {len(anomalies)} unusual months detected across "
+                 f"{len(HS_CODES) * 2} HS-code files.")
+    return "\n".join(lines)
+
+def aggregate_pivot(scope, reporter, resolution):
+    # Date x Partners view of a stored aggregate; quarters and years sit at their last month
+    aggregates = load_trade_aggregates(scope)[0 if reporter == "CN" else 1]
+    df_pivot = aggregates.frame(resolution).T
+    df_pivot.index = df_pivot.index.to_timestamp(how="end").to_period("M").to_timestamp()
+    return df_pivot
+
+def plot_pivot(df_pivot, ylabel="Trade Balance", change_points=None, anomalies=None):
+    fig, ax = plt.subplots(figsize=(14, 6))
+    colors = {}
+    for country in df_pivot.columns:
+        line, = ax.plot(df_pivot.index, df_pivot[country], label=country)
+        colors[country] = line.get_color()
+    # Dotted lines mark level shifts, crosses mark unusual months (see detection.py)
+    if change_points is not None:
+        for _, row in change_points.iterrows():
+            ax.axvline(row["date"], color=colors.get(row["partner"], "gray"), linestyle=":", alpha=0.7)
+    if anomalies is not None and len(anomalies):
+        ax.scatter(anomalies["date"], anomalies["value"], marker="x", s=60, zorder=3,
+                   c=[colors.get(p, "gray") for p in anomalies["partner"]])
+    ax.set_xlabel("Month-Year")
+    ax.set_ylabel(ylabel)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b-%Y'))
+    plt.xticks(rotation=45)
+    ax.legend(loc='center left', bbox_to_anchor=(1.0, 0.5))
+    plt.tight_layout()
+
+    st.pyplot(fig)
+    plt.close(fig)
+
 def plot_trade_balances():
-    for url in CSV_SOURCE_FILES:
-        try:
-            df = pd.read_csv(url)
-            if "Partners" not in df.columns:
-                st.warning(f"Skipping {url}: 'Partners' column not found.")
-                continue
-
-            df_melted = df.melt(id_vars=["Partners"], var_name="Date", value_name="Trade Balance")
-            df_melted[["Year", "Month"]] = df_melted["Date"].str.extract(r"(\d{4})-M(\d{2})")
-            df_melted["Date"] = pd.to_datetime(df_melted["Year"] + "-" + df_melted["Month"], format="%Y-%m")
-            df_pivot = df_melted.pivot(index="Date", columns="Partners", values="Trade Balance")
-
-            file_name = url.split("/")[-1].replace(".csv", "")
-            title = CUSTOM_TITLES.get(file_name, f"Trade Balance for {file_name}")
-
-            st.markdown(f"### {title}")
-
-            fig, ax = plt.subplots(figsize=(14, 6))
-            for country in df_pivot.columns:
-                ax.plot(df_pivot.index, df_pivot[country], label=country)
-            ax.set_xlabel("Month-Year")
-            ax.set_ylabel("Trade Balance")
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b-%Y'))
-            plt.xticks(rotation=45)
-            ax.legend(loc='center left', bbox_to_anchor=(1.0, 0.5))
-            plt.tight_layout()
-
-            st.pyplot(fig)
-            plt.close(fig)
+    resolution = st.selectbox("Chart resolution:", RESOLUTIONS, key="product_resolution")
+    ylabel = "Change vs same month last year" if resolution == "YoY change" else "Trade Balance"
+    change_points, anomalies = load_trade_findings()
+    if resolution == "Monthly":
+        st.caption("Dotted lines mark detected level shifts; crosses mark unusual months.")
+
+    # Every resolution, Monthly included, comes from the stored aggregates over load_and_clean_hs,
+    # so each combined_{HS}_{reporter} file is downloaded and parsed once for EDA and this page
+    for hs in HS_CODES:
+        for reporter in ("CN", "US"):
+            file_name = f"combined_{hs}_{reporter}"
+            try:
+                title = CUSTOM_TITLES.get(file_name, f"Trade Balance for {file_name}")
+                df_pivot = aggregate_pivot(hs, reporter, resolution)
+                if resolution == "Monthly":
+                    marks = findings_for(change_points, hs, reporter), findings_for(anomalies, hs, reporter)
+                else:
+                    marks = None, None
 
+                st.markdown(f"### {title} ({resolution})")
+                plot_pivot(df_pivot, ylabel, *marks)
+
+            except Exception as e:
+                st.error(f"Error processing {file_name}.csv: {e}")
+
+    # Totals over every tracked HS code, per reporter
+    for reporter, name in (("CN", "China"), ("US", "US")):
+        try:
+            st.markdown(f"### Trade Balance of *all tracked HS codes combined* ({', '.join(map(str, HS_CODES))}) - {name} Towards Other Countries ({resolution})")
+            plot_pivot(aggregate_pivot(COMBINED_HS_SCOPE, reporter, resolution), ylabel)
         except Exception as e:
-            st.error(f"Error processing {url}: {e}")
+            st.error(f"Error combining HS codes for {name}: {e}")
 
     # Summary insights section
     st.markdown("## 📊 Summary Insights & Conclusion")
-
-    st.markdown("""
-    ### 🟢 China
-    - Strong **positive trade balances** in:
-      - HS 39: Plastics
-      - HS 84 & 85: Machinery & Electrical equipment
-      - HS 87: Vehicles
-    - **Negative trade balance** in:
-      - HS 12 (agriculture): Heavy importer
-
-    ### 🔵 United States
-    - **Positive trade balances** in:
-      - HS 12: Agriculture (strong exporter)
-    - **Mixed or negative balances** in:
-      - HS 39, 84, 85, 87: Indicates reliance on imports
-      - HS 90 & 94: Competitive but fluctuating
-
-    ---
-
-    ### ✅ Final Conclusion:
-    - **China dominates in manufacturing-related exports** (machinery, electronics, vehicles).
-    - **US leads in agriculture**, but is **less competitive** in manufactured goods.
-    - Trade imbalances align with each country’s **industrial strengths and dependencies**.
-    """)
+    st.markdown(trade_summary_markdown(change_points, anomalies))
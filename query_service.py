@@ -0,0 +1,170 @@
+# query_service.py
+# Local HTTP service over the same parsed stores the dashboard uses, so notebooks and
+# alerting jobs can query one warm process instead of re-parsing the CSVs themselves.
+#
+#   python query_service.py --port 8765
+#
+#   POST /series     {"keys": [["CN", 85, "Viet Nam"], ["US", "ALL", "Canada"]], "start": "2021-01", "end": "2024-12"}
+#   POST /sentiment  {"countries": ["Canada", "China"], "granularity": "Quarterly"}
+#   GET  /health, GET /stats
+#
+# Responses are compact JSON ({"columns": [...], "data": [[...], ...]}) or, with
+# "Accept: application/vnd.apache.arrow.stream" and pyarrow installed, Arrow IPC.
+import argparse
+import io
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from data_cache import cache, warm_up
+from data_cleaning import HS_CODES
+from EDA import AGGREGATE_SCOPE, load_monthly_scope
+from sentiment import TIME_GRANULARITY_PERIODS, load_sentiment_source
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+JSON_MIME = "application/json"
+RESPONSE_TTL_SECONDS = 300
+REPORTERS = {"CN": 0, "US": 1}
+AGGREGATE_HS = "ALL"
+
+
+class QueryError(ValueError):
+    pass
+
+
+# === QUERIES ===
+def query_series(keys, start=None, end=None):
+    # keys: iterable of (reporter, hs, partner); hs is an HS code or "ALL" for the aggregate files
+    by_frame = {}
+    for key in keys:
+        if len(key) != 3:
+            raise QueryError(f"Series key must be [reporter, hs, partner], got {key!r}")
+        reporter, hs, partner = key
+        if reporter not in REPORTERS:
+            raise QueryError(f"Unknown reporter {reporter!r}, expected one of {list(REPORTERS)}")
+        hs = AGGREGATE_HS if str(hs).upper() == AGGREGATE_HS else int(hs)
+        if hs != AGGREGATE_HS and hs not in HS_CODES:
+            raise QueryError(f"Unknown HS code {hs!r}, expected one of {HS_CODES} or {AGGREGATE_HS!r}")
+        by_frame.setdefault((reporter, hs), []).append(partner)
+
+    frames = []
+    for (reporter, hs), partners in by_frame.items():
+        scope = AGGREGATE_SCOPE if hs == AGGREGATE_HS else hs
+        wide = load_monthly_scope(scope)[REPORTERS[reporter]]
+        unknown = [p for p in partners if p not in wide.index]
+        if unknown:
+            raise QueryError(f"Unknown partners for {reporter}/{hs}: {unknown}")
+        # Sorted PeriodIndex: the date range is a slice, not a scan
+        window = wide.loc[partners, start:end]
+        long = window.stack().rename("trade_balance").reset_index()
+        long.columns = ["partner", "period", "trade_balance"]
+        long.insert(0, "hs", str(hs))
+        long.insert(0, "reporter", reporter)
+        frames.append(long)
+
+    if not frames:
+        return pd.DataFrame(columns=["reporter", "hs", "partner", "period", "trade_balance"])
+    result = pd.concat(frames, ignore_index=True)
+    result["period"] = result["period"].astype(str)
+    return result
+
+
+def query_sentiment(countries, granularity="Monthly"):
+    if granularity not in TIME_GRANULARITY_PERIODS:
+        raise QueryError(f"Unknown granularity {granularity!r}, expected one of {list(TIME_GRANULARITY_PERIODS)}")
+    timeline_data = load_sentiment_source().timeline(countries, granularity)
+    return timeline_data.drop(columns=['time_period'])
+
+
+QUERIES = {
+    "/series": lambda body: query_series(body.get("keys", []), body.get("start"), body.get("end")),
+    "/sentiment": lambda body: query_sentiment(body.get("countries", []), body.get("granularity", "Monthly")),
+}
+
+
+# === ENCODING ===
+def encode_frame(frame, mime):
+    if mime == ARROW_MIME:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    payload = {"columns": list(frame.columns), "data": frame.astype(object).where(frame.notna(), None).values.tolist()}
+    return json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def handle_query(path, raw_body, mime):
+    # Identical requests (after normalising the JSON body) are answered from the shared cache
+    body = json.loads(raw_body or b"{}")
+    if not isinstance(body, dict):
+        raise QueryError("Request body must be a JSON object")
+    key = ("query_service", path, json.dumps(body, sort_keys=True), mime)
+    return cache.get_or_load(key, lambda: encode_frame(QUERIES[path](body), mime), RESPONSE_TTL_SECONDS)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests from the same client
+    protocol_version = "HTTP/1.1"
+
+    def send_body(self, status, body, mime):
+        self.send_response(status)
+        self.send_header("Content-Type", mime)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_body(status, json.dumps({"error": message}).encode("utf-8"), JSON_MIME)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_body(200, b'{"status":"ok"}', JSON_MIME)
+        elif self.path == "/stats":
+            self.send_body(200, json.dumps(cache.stats()).encode("utf-8"), JSON_MIME)
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        raw_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path not in QUERIES:
+            self.send_error_json(404, f"Unknown path {self.path}")
+            return
+        mime = ARROW_MIME if ARROW_MIME in self.headers.get("Accept", "") else JSON_MIME
+        if mime == ARROW_MIME and pa is None:
+            self.send_error_json(406, "Arrow responses need pyarrow installed on the server")
+            return
+        try:
+            body = handle_query(self.path, raw_body, mime)
+        except (QueryError, ValueError, TypeError) as e:
+            self.send_error_json(400, str(e))
+            return
+        except Exception as e:
+            self.send_error_json(500, f"{type(e).__name__}: {e}")
+            return
+        self.send_body(200, body, mime)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve trade and sentiment queries from a warm process.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-warm-up", action="store_true", help="load datasets lazily on first query")
+    args = parser.parse_args()
+
+    if not args.no_warm_up:
+        for loader, error in warm_up():
+            print(f"Warm-up failed for {loader}: {error}")
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    print(f"Serving on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
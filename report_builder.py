@@ -0,0 +1,551 @@
+# report_builder.py
+# Renders the dashboard sections headlessly into a static HTML + PNG/SVG bundle.
+#
+#   python report_builder.py --out report_bundle            # rebuild sections whose inputs changed
+#   python report_builder.py --out report_bundle --force    # rebuild everything
+#
+# dashboard.py serves the bundle with no compute when WIF3009_REPORT_BUNDLE points at it.
+import argparse
+import ast
+import base64
+import hashlib
+import html
+import importlib
+import inspect
+import json
+import mimetypes
+import os
+import re
+import textwrap
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+from data_cache import shared_cache
+from data_cleaning import DATA_BASE_URL, HS_CODES
+from sentiment import SENTIMENT_CORPUS_PATH, SENTIMENT_DATA_URL
+
+MANIFEST_FILE = "manifest.json"
+BUNDLE_PAGE_HEIGHT = 2400
+# The plotly.js build that ships with the installed plotly.py, so figure JSON and runtime match
+PLOTLY_JS_FILE = f"plotly-{get_plotlyjs_version()}.min.js"
+
+# slug -> (title, module, function, input data sources)
+REPORT_SECTIONS = {
+    "project_scope": (
+        "Project Scope and Justification", "introduction_Q1", "display_project_scope_justification", []
+    ),
+    "trade_balance_charts": (
+        "Trade Balance Comparison", "EDA", "show_trade_balance_charts",
+        [f"{DATA_BASE_URL}/combined_trade_balance_China.csv", f"{DATA_BASE_URL}/combined_trade_balance_US.csv"]
+        + [f"{DATA_BASE_URL}/combined_{hs}_{reporter}.csv" for hs in HS_CODES for reporter in ("CN", "US")],
+    ),
+    "trade_balances_by_hs": (
+        "Trade Balance by HS Code", "product_analysis", "plot_trade_balances",
+        [f"{DATA_BASE_URL}/combined_{hs}_{reporter}.csv" for hs in HS_CODES for reporter in ("CN", "US")],
+    ),
+    "sentiment_dashboard": (
+        "Sentiment Analysis", "sentiment", "display_country_timeline_sentiment_dashboard",
+        # With WIF3009_SENTIMENT_CORPUS set the page is aggregated from that corpus instead
+        [SENTIMENT_CORPUS_PATH or SENTIMENT_DATA_URL],
+    ),
+    "similarity": (
+        "Similarity of Trade-Balance Trajectories", "similarity", "display_similarity_analysis",
+        [f"{DATA_BASE_URL}/combined_{hs}_{reporter}.csv" for hs in HS_CODES for reporter in ("CN", "US")],
+    ),
+}
+
+# Dashboard navigation section -> bundle pages that replace it in static mode
+DASHBOARD_PAGES = {
+    "Data Collection & Cleaning": ["project_scope"],
+    "Exploratory Data Analysis": ["trade_balance_charts", "trade_balances_by_hs"],
+    "Sentiment Analysis": ["sentiment_dashboard"],
+    "Correlation Analysis": ["similarity"],
+}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{scripts}
+<style>
+body {{ font-family: sans-serif; margin: 2rem auto; max-width: 1400px; padding: 0 1rem; }}
+.row {{ display: flex; gap: 1.5rem; }}
+.row > div {{ flex: 1; min-width: 0; }}
+.metric {{ margin: 0.5rem 0; }}
+.metric .label {{ font-size: 0.85rem; color: #555; }}
+.metric .value {{ font-size: 1.8rem; }}
+.warning {{ background: #fff4d6; padding: 0.5rem; }}
+.error {{ background: #fde2e1; padding: 0.5rem; }}
+.info {{ background: #e3f0fc; padding: 0.5rem; }}
+.success {{ background: #e0f4e5; padding: 0.5rem; }}
+table {{ border-collapse: collapse; font-size: 0.85rem; }}
+td, th {{ border: 1px solid #ddd; padding: 0.2rem 0.5rem; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+<p><small>Generated {built_at}</small></p>
+{body}
+</body>
+</html>
+"""
+
+
+# === MARKDOWN ===
+def inline_markdown(text):
+    text = html.escape(text, quote=False)
+    text = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r'<a href="\2">\1</a>', text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"\*(.+?)\*", r"<em>\1</em>", text)
+    return text
+
+
+def markdown_to_html(text):
+    # Covers the subset the sections use: headings, nested bullets, bold/italic, links and rules
+    out = []
+    list_indents = []
+    for line in textwrap.dedent(str(text)).strip("\n").splitlines():
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        if stripped.startswith(("- ", "* ")):
+            while list_indents and indent < list_indents[-1]:
+                out.append("</ul>")
+                list_indents.pop()
+            if not list_indents or indent > list_indents[-1]:
+                out.append("<ul>")
+                list_indents.append(indent)
+            out.append(f"<li>{inline_markdown(stripped[2:])}</li>")
+            continue
+        while list_indents:
+            out.append("</ul>")
+            list_indents.pop()
+        heading = re.match(r"(#{1,6})\s+(.*)", stripped)
+        if not stripped:
+            continue
+        elif stripped == "---":
+            out.append("<hr>")
+        elif heading:
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{inline_markdown(heading.group(2))}</h{level}>")
+        else:
+            out.append(f"<p>{inline_markdown(stripped)}</p>")
+    out.extend("</ul>" for _ in list_indents)
+    return "\n".join(out)
+
+
+# === HEADLESS STREAMLIT RECORDER ===
+class StaticContainer:
+    def __init__(self, page, tag="div", header=""):
+        self.page = page
+        self.tag = tag
+        self.header = header
+        self.parts = []
+
+    def __enter__(self):
+        self.page._stack.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.page._stack.pop()
+        return False
+
+    def __getattr__(self, name):
+        # col1.metric(...) style calls write into this container
+        method = getattr(self.page, name)
+
+        def call(*args, **kwargs):
+            with self:
+                return method(*args, **kwargs)
+        return call
+
+    def render(self):
+        body = "\n".join(part.render() if isinstance(part, StaticContainer) else part for part in self.parts)
+        return f"<{self.tag}>{self.header}\n{body}\n</{self.tag}>"
+
+
+class StaticRow(StaticContainer):
+    def render(self):
+        return '<div class="row">\n' + "\n".join(col.render() for col in self.parts) + "\n</div>"
+
+
+class StaticPage:
+    """Stands in for the ``streamlit`` module while a section renders to static HTML.
+
+    Widgets return their defaults, figures are written to the bundle directory and
+    everything else is appended to the page body.
+    """
+
+    def __init__(self, out_dir, slug, close_figures=True):
+        self.out_dir = out_dir
+        self.slug = slug
+        self.close_figures = close_figures
+        self.root = StaticContainer(self)
+        self._stack = [self.root]
+        self.files = []
+        self.uses_plotly = False
+        self.session_state = {}
+        self.query_params = {}
+        self.sidebar = StaticContainer(self)
+
+    def _emit(self, part):
+        if isinstance(part, str) and "Plotly.newPlot" in part:
+            self.uses_plotly = True
+        self._stack[-1].parts.append(part)
+
+    def _asset(self, suffix):
+        name = f"{self.slug}_{len(self.files) + 1:03d}{suffix}"
+        self.files.append(name)
+        return name, os.path.join(self.out_dir, name)
+
+    def __getattr__(self, name):
+        # Anything the recorder does not know about (spinners, toasts, ...) is a no-op
+        def noop(*args, **kwargs):
+            return StaticContainer(self)
+        return noop
+
+    # --- text ---
+    def title(self, text, **kwargs):
+        self._emit(f"<h1>{inline_markdown(str(text))}</h1>")
+
+    def header(self, text, **kwargs):
+        self._emit(f"<h2>{inline_markdown(str(text))}</h2>")
+
+    def subheader(self, text, **kwargs):
+        self._emit(f"<h3>{inline_markdown(str(text))}</h3>")
+
+    def markdown(self, text, **kwargs):
+        self._emit(markdown_to_html(text))
+
+    def write(self, *args, **kwargs):
+        for arg in args:
+            if isinstance(arg, (pd.DataFrame, pd.Series)):
+                self.dataframe(arg)
+            else:
+                self.markdown(str(arg))
+
+    def _alert(self, kind, text, **kwargs):
+        self._emit(f'<div class="{kind}">{markdown_to_html(text)}</div>')
+
+    def warning(self, text, **kwargs):
+        self._alert("warning", text)
+
+    def error(self, text, **kwargs):
+        self._alert("error", text)
+
+    def info(self, text, **kwargs):
+        self._alert("info", text)
+
+    def success(self, text, **kwargs):
+        self._alert("success", text)
+
+    def metric(self, label, value, delta=None, **kwargs):
+        self._emit(f'<div class="metric"><div class="label">{html.escape(str(label))}</div>'
+                   f'<div class="value">{html.escape(str(value))}</div></div>')
+
+    # --- data ---
+    def dataframe(self, data, **kwargs):
+        if hasattr(data, "to_html"):
+            self._emit(data.to_html())
+        else:
+            self._emit(pd.DataFrame(data).to_html())
+
+    def table(self, data, **kwargs):
+        self.dataframe(data)
+
+    def download_button(self, label, data, file_name, **kwargs):
+        name, path = self._asset("_" + os.path.basename(file_name))
+        with open(path, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        self._emit(f'<p><a href="{name}" download="{html.escape(file_name)}">{inline_markdown(label)}</a></p>')
+
+    # --- figures ---
+    def pyplot(self, fig=None, **kwargs):
+        import matplotlib.pyplot as plt
+        fig = fig if fig is not None else plt.gcf()
+        png_name, png_path = self._asset(".png")
+        svg_name, svg_path = self._asset(".svg")
+        fig.savefig(png_path, dpi=110, bbox_inches="tight")
+        fig.savefig(svg_path, bbox_inches="tight")
+        if self.close_figures:
+            plt.close(fig)
+        self._emit(f'<p><img src="{png_name}"><br><a href="{svg_name}">SVG</a></p>')
+
+    def plotly_chart(self, fig, **kwargs):
+        json_name, json_path = self._asset(".json")
+        fig_json = fig.to_json()
+        with open(json_path, "w") as f:
+            f.write(fig_json)
+        image_links = []
+        for suffix in (".png", ".svg"):
+            try:
+                image_name, image_path = self._asset(suffix)
+                fig.write_image(image_path)
+                image_links.append(f'<a href="{image_name}">{suffix[1:].upper()}</a>')
+            except Exception:
+                # Static image export needs kaleido; the interactive JSON is still bundled
+                self.files.pop()
+        div_id = json_name.replace(".", "_")
+        self._emit(f'<div id="{div_id}"></div>'
+                   f'<script>var f = {fig_json}; Plotly.newPlot("{div_id}", f.data, f.layout, {{responsive: true}});</script>'
+                   f'<p>{" | ".join(image_links)}</p>')
+
+    # --- layout ---
+    def columns(self, spec, **kwargs):
+        count = spec if isinstance(spec, int) else len(spec)
+        row = StaticRow(self)
+        row.parts = [StaticContainer(self) for _ in range(count)]
+        self._emit(row)
+        return row.parts
+
+    def tabs(self, labels):
+        tabs = [StaticContainer(self, "section", f"<h3>{html.escape(label)}</h3>") for label in labels]
+        for tab in tabs:
+            self._emit(tab)
+        return tabs
+
+    def expander(self, label, expanded=False, **kwargs):
+        container = StaticContainer(self, "details", f"<summary>{inline_markdown(label)}</summary>")
+        self._emit(container)
+        return container
+
+    def container(self, **kwargs):
+        container = StaticContainer(self)
+        self._emit(container)
+        return container
+
+    def fragment(self, func=None, **kwargs):
+        # Fragments only matter for interactive reruns; headless they run inline
+        return func if func is not None else (lambda f: f)
+
+    # --- widgets render with their default value ---
+    def selectbox(self, label, options, index=0, **kwargs):
+        options = list(options)
+        return options[index] if options and index is not None else None
+
+    def radio(self, label, options, index=0, **kwargs):
+        return self.selectbox(label, options, index)
+
+    def multiselect(self, label, options, default=None, **kwargs):
+        return list(default or [])
+
+    def checkbox(self, label, value=False, **kwargs):
+        return value
+
+    def button(self, label, **kwargs):
+        return False
+
+    def render(self, title):
+        scripts = f'<script src="{PLOTLY_JS_FILE}"></script>' if self.uses_plotly else ""
+        return PAGE_TEMPLATE.format(title=html.escape(title), scripts=scripts,
+                                    built_at=datetime.now().strftime("%Y-%m-%d %H:%M"), body=self.root.render())
+
+
+def data_uri(path):
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+
+
+def inline_assets(page_html, out_dir):
+    # Self-contained copy for serving from dashboard.py: components.html renders it in a srcdoc
+    # iframe, where nothing relative to the bundle directory resolves
+    def local(name):
+        return ":" not in name and os.path.isfile(os.path.join(out_dir, name))
+
+    def embed_src(match):
+        name = match.group(1)
+        return f'<img src="{data_uri(os.path.join(out_dir, name))}"' if local(name) else match.group(0)
+
+    def embed_link(match):
+        # Linked assets (SVGs, CSV downloads) become downloads, since the iframe cannot open them
+        name, download = match.group(1), match.group(2)
+        if not local(name):
+            return match.group(0)
+        download = download or f' download="{html.escape(name)}"'
+        return f'<a href="{data_uri(os.path.join(out_dir, name))}"{download}'
+
+    page_html = re.sub(r'<img src="([^"]+)"', embed_src, page_html)
+    page_html = re.sub(r'<a href="([^"]+)"((?:\s+download="[^"]*")?)', embed_link, page_html)
+    return page_html.replace(f'<script src="{PLOTLY_JS_FILE}"></script>', f"<script>{get_plotlyjs()}</script>")
+
+
+def write_plotly_js(out_dir):
+    # Shared by every page of the bundle; written atomically since sections render in parallel
+    path = os.path.join(out_dir, PLOTLY_JS_FILE)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+        os.replace(tmp_path, path)
+
+
+# === BUILD ===
+def read_source(source):
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source) as response:
+            return response.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def source_digest(source):
+    digest = hashlib.sha256()
+    if os.path.isdir(source):
+        # Partitioned corpora can be large: fingerprint the file listing instead of the bytes
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, source)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    elif source.startswith(("http://", "https://")):
+        digest.update(read_source(source))
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.digest()
+
+
+def repo_modules(module_name):
+    # The section module plus every repo module it imports, directly or through other repo modules
+    # (imports inside functions included); third-party and stdlib modules are skipped
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    found, pending = set(), [module_name]
+    while pending:
+        name = pending.pop()
+        path = os.path.join(repo_dir, f"{name}.py")
+        if name in found or not os.path.exists(path):
+            continue
+        found.add(name)
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending += [alias.name.split(".")[0] for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module.split(".")[0])
+    return sorted(found)
+
+
+def section_input_hash(slug):
+    _, module_name, _, sources = REPORT_SECTIONS[slug]
+    digest = hashlib.sha256()
+    digest.update(PLOTLY_JS_FILE.encode("utf-8"))
+    # Section code is an input too: editing a chart, or any helper it imports, must invalidate its pages
+    for name in repo_modules(module_name):
+        digest.update(name.encode("utf-8"))
+        digest.update(inspect.getsource(importlib.import_module(name)).encode("utf-8"))
+    for source in sources:
+        digest.update(source.encode("utf-8"))
+        digest.update(source_digest(source))
+    return digest.hexdigest()
+
+
+def render_section(slug, out_dir, close_figures=True):
+    import matplotlib
+    matplotlib.use("Agg")
+
+    title, module_name, function_name, _ = REPORT_SECTIONS[slug]
+    module = importlib.import_module(module_name)
+    page = StaticPage(out_dir, slug, close_figures)
+    original_st = module.st
+    module.st = page
+    try:
+        getattr(module, function_name)()
+    finally:
+        module.st = original_st
+
+    page_html = page.render(title)
+    if page.uses_plotly:
+        write_plotly_js(out_dir)
+    with open(os.path.join(out_dir, f"{slug}.html"), "w", encoding="utf-8") as f:
+        f.write(page_html)
+    with open(os.path.join(out_dir, f"{slug}.inline.html"), "w", encoding="utf-8") as f:
+        f.write(inline_assets(page_html, out_dir))
+    return page.files + ([PLOTLY_JS_FILE] if page.uses_plotly else [])
+
+
+def load_bundle_page(out_dir, slug):
+    # The file's mtime is part of the cache key, so a rebuilt bundle is served straight away
+    path = os.path.join(out_dir, f"{slug}.inline.html")
+    return read_bundle_page(path, os.path.getmtime(path))
+
+
+@shared_cache()
+def read_bundle_page(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"sections": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_index(out_dir, manifest):
+    links = "\n".join(
+        f'<li><a href="{slug}.html">{html.escape(entry["title"])}</a> <small>(built {entry["built_at"]})</small></li>'
+        for slug, entry in manifest["sections"].items()
+    )
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(PAGE_TEMPLATE.format(title="Impact Analysis of US-China Tariffs", scripts="",
+                                     built_at=datetime.now().strftime("%Y-%m-%d %H:%M"),
+                                     body=f"<h1>Impact Analysis of US-China Tariffs</h1>\n<ul>\n{links}\n</ul>"))
+
+
+def build_report(out_dir, sections=None, force=False, workers=None):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    sections = sections or list(REPORT_SECTIONS)
+
+    hashes = {slug: section_input_hash(slug) for slug in sections}
+    stale = [
+        slug for slug in sections
+        if force
+        or manifest["sections"].get(slug, {}).get("input_hash") != hashes[slug]
+        or not os.path.exists(os.path.join(out_dir, f"{slug}.html"))
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(render_section, slug, out_dir): slug for slug in stale}
+        for future in as_completed(futures):
+            slug = futures[future]
+            manifest["sections"][slug] = {
+                "title": REPORT_SECTIONS[slug][0],
+                "input_hash": hashes[slug],
+                "built_at": datetime.now().isoformat(timespec="seconds"),
+                "files": [f"{slug}.html", f"{slug}.inline.html"] + future.result(),
+            }
+
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    write_index(out_dir, manifest)
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the dashboard sections to a static bundle.")
+    parser.add_argument("--out", default="report_bundle", help="bundle directory")
+    parser.add_argument("--sections", nargs="*", choices=list(REPORT_SECTIONS), help="sections to consider (default: all)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=None, help="parallel render processes")
+    args = parser.parse_args()
+
+    rebuilt = build_report(args.out, args.sections, args.force, args.workers)
+    skipped = [slug for slug in (args.sections or REPORT_SECTIONS) if slug not in rebuilt]
+    print(f"Rebuilt: {', '.join(rebuilt) or 'nothing'}")
+    if skipped:
+        print(f"Unchanged: {', '.join(skipped)}")
+
+
+if __name__ == "__main__":
+    main()
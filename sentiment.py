@@ -1,132 +1,230 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime
+import os
 import numpy as np
+from data_cache import shared_cache
+from figures import box_figure, box_summary, cached_figure, line_options, scatter_trace
+from detection import detect
 
-def display_country_timeline_sentiment_dashboard():
-    df = pd.read_csv('https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/tariff_news_with_sentiment.csv', encoding='ISO-8859-1')
-    df['publishedAt'] = pd.to_datetime(df['publishedAt'], errors='coerce')
+SENTIMENT_DATA_URL = 'https://raw.githubusercontent.com/ngernyi/WIF3009/refs/heads/main/tariff_news_with_sentiment.csv'
 
-    st.title("🌍 Country Sentiment Timeline Analysis - Tariff News")
-    
-    if 'sentiment_score' not in df.columns:
-        st.error("Please run sentiment analysis first!")
-        return
-    
-    # Ensure proper date processing
+@shared_cache()
+def load_sentiment_data():
+    # Shared across sessions: callers must copy before adding or changing columns
+    df = pd.read_csv(SENTIMENT_DATA_URL, encoding='ISO-8859-1')
+    df['publishedAt'] = pd.to_datetime(df['publishedAt'], errors='coerce')
     if 'month' not in df.columns:
-        if 'publishedAt' in df.columns:
-            try:
-                df['publishedAt'] = pd.to_datetime(df['publishedAt'])
-                df['month'] = df['publishedAt'].dt.to_period('M')
-                df['year_month'] = df['publishedAt'].dt.strftime('%Y-%m')
-                df['year'] = df['publishedAt'].dt.year
-                df['quarter'] = df['publishedAt'].dt.to_period('Q')
-            except Exception as e:
-                st.warning(f"Could not process dates: {e}")
-                return
-        else:
-            st.warning("No 'publishedAt' column found.")
-            return
-    
-    if 'country' not in df.columns:
-        st.warning("No 'country' column found. Country analysis cannot be performed.")
-        return
-    
-    # === OVERVIEW METRICS ===
-    st.header("📊 Timeline Overview")
-    
-    # Time range info
-    # date_range = f"{df['publishedAt'].min().strftime('%Y-%m-%d')} to {df['publishedAt'].max().strftime('%Y-%m-%d')}"
-    total_months = len(df['month'].unique())
-    total_countries = len(df['country'].unique())
-    
-    col1, col2, col3 = st.columns(3)
-    # with col1:
-    #     st.metric("Date Range", date_range)
-    with col1:
-        st.metric("Total Months", total_months)
-    with col2:
-        st.metric("Countries Analyzed", total_countries)
-    with col3:
-        st.metric("Total Articles", len(df))
-    
-    # === COUNTRY SELECTION ===
-    st.header("🎯 Country Selection & Filtering")
-    
-    # Get countries sorted by article count
-    country_counts = df['country'].value_counts()
-    
-    col1, col2 = st.columns([2, 1])
-    with col1:
-        # Multi-select for countries with smart defaults (top 10)
-        default_countries = country_counts.head(10).index.tolist()
-        selected_countries = st.multiselect(
-            "Select countries to analyze (default: top 10 by article count):",
-            options=country_counts.index.tolist(),
-            default=default_countries,
-            key="country_timeline_selector"
-        )
-    
-    with col2:
-        # Time granularity selection
-        time_granularity = st.selectbox(
-            "Time Granularity:",
-            ["Monthly", "Quarterly", "Yearly"],
-            index=0
-        )
-    
-    if not selected_countries:
-        st.warning("Please select at least one country to analyze.")
-        return
-    
-    # Filter data
-    filtered_df = df[df['country'].isin(selected_countries)].copy()
-    
-    # === MAIN TIMELINE VISUALIZATION ===
-    st.header("📈 Country Sentiment Timeline - Full Analysis")
-    
-    # Prepare data based on granularity
-    if time_granularity == "Monthly":
-        time_col = 'year_month'
-        time_period = 'month'
-    elif time_granularity == "Quarterly":
-        time_col = 'quarter'
-        time_period = 'quarter'
-        filtered_df['quarter'] = filtered_df['publishedAt'].dt.to_period('Q')
-    else:  # Yearly
-        time_col = 'year'
-        time_period = 'year'
-    
-    # Create timeline data
-    timeline_data = filtered_df.groupby(['country', time_period]).agg({
-        'sentiment_score': ['mean', 'std', 'count'],
-        'sentiment_label': lambda x: {
-            'positive': (x == 'positive').sum(),
-            'negative': (x == 'negative').sum(),
-            'neutral': (x == 'neutral').sum()
-        }
-    }).reset_index()
-    
-    # Flatten columns
-    timeline_data.columns = ['country', 'time_period', 'avg_sentiment', 'sentiment_std', 'article_count', 'sentiment_breakdown']
-    
-    # Extract sentiment breakdowns
-    timeline_data['positive_count'] = timeline_data['sentiment_breakdown'].apply(lambda x: x['positive'])
-    timeline_data['negative_count'] = timeline_data['sentiment_breakdown'].apply(lambda x: x['negative'])
-    timeline_data['neutral_count'] = timeline_data['sentiment_breakdown'].apply(lambda x: x['neutral'])
+        df['month'] = df['publishedAt'].dt.to_period('M')
+        df['year_month'] = df['publishedAt'].dt.strftime('%Y-%m')
+        # Nullable ints keep years as 2022, not 2022.0, when some dates fail to parse
+        df['year'] = df['publishedAt'].dt.year.astype('Int64')
+        df['quarter'] = df['publishedAt'].dt.to_period('Q')
+    return df
+
+TIME_GRANULARITY_PERIODS = {"Monthly": "month", "Quarterly": "quarter", "Yearly": "year"}
+SENTIMENT_LABELS = ['positive', 'negative', 'neutral']
+# Monthly per-country series scanned for level shifts and unusual months
+FINDING_METRICS = ['article_count', 'negative_count', 'positive_count', 'avg_sentiment']
+SUMMARY_COUNTRIES = 4
+
+# Environment switch for corpora bigger than RAM: aggregate the CSV/Parquet corpus in chunks
+SENTIMENT_CORPUS_PATH = os.environ.get("WIF3009_SENTIMENT_CORPUS")
+SENTIMENT_MEMORY_BUDGET_MB = int(os.environ.get("WIF3009_SENTIMENT_MEMORY_MB", 256))
+
+def with_label_flags(df):
+    labels = df['sentiment_label']
+    return df.assign(**{f'{label}_count': labels == label for label in SENTIMENT_LABELS})
+
+# The rollups are split into a raw aggregation (count, mean, std, min, max, label counts)
+# and a finishing step, so the out-of-core path in sentiment_chunked.py can rebuild the
+# raw aggregates from merged partials and share the derived columns with this path.
+def finish_timeline_data(timeline_data):
     timeline_data['positive_pct'] = (timeline_data['positive_count'] / timeline_data['article_count'] * 100).round(1)
     timeline_data['negative_pct'] = (timeline_data['negative_count'] / timeline_data['article_count'] * 100).round(1)
     
     # Convert time_period to string for plotting
     timeline_data['time_str'] = timeline_data['time_period'].astype(str)
+    return timeline_data
+
+def build_timeline_data(filtered_df, time_granularity):
+    time_period = TIME_GRANULARITY_PERIODS[time_granularity]
     
-    # === 1. MAIN SENTIMENT TIMELINE (FULL WIDTH) ===
-    st.subheader("🌍 Average Sentiment Score by Country Over Time")
+    # Create timeline data
+    timeline_data = with_label_flags(filtered_df).groupby(['country', time_period]).agg(
+        avg_sentiment=('sentiment_score', 'mean'),
+        sentiment_std=('sentiment_score', 'std'),
+        article_count=('sentiment_score', 'count'),
+        positive_count=('positive_count', 'sum'),
+        negative_count=('negative_count', 'sum'),
+        neutral_count=('neutral_count', 'sum'),
+    ).reset_index().rename(columns={time_period: 'time_period'})
+    return finish_timeline_data(timeline_data)
+
+def finish_country_stats(country_stats):
+    country_stats = country_stats.round(4)
+    
+    # Add percentage and derived metrics
+    country_stats['Positive_Pct'] = (country_stats['Positive_Count'] / country_stats['Total_Articles'] * 100).round(1)
+    country_stats['Negative_Pct'] = (country_stats['Negative_Count'] / country_stats['Total_Articles'] * 100).round(1)
+    country_stats['Neutral_Pct'] = (country_stats['Neutral_Count'] / country_stats['Total_Articles'] * 100).round(1)
+    country_stats['Sentiment_Range'] = (country_stats['Max_Sentiment'] - country_stats['Min_Sentiment']).round(4)
+    country_stats['Volatility_Score'] = (country_stats['Sentiment_StdDev'] / country_stats['Total_Articles'] * 1000).round(2)
+    
+    # Add dominant sentiment
+    country_stats['Dominant_Sentiment'] = country_stats[['Positive_Count', 'Negative_Count', 'Neutral_Count']].idxmax(axis=1)
+    country_stats['Dominant_Sentiment'] = country_stats['Dominant_Sentiment'].str.replace('_Count', '').str.lower()
     
+    # Sort by average sentiment
+    country_stats = country_stats.sort_values('Avg_Sentiment', ascending=False)
+    return country_stats
+
+def build_country_stats(filtered_df):
+    # Create comprehensive country statistics
+    country_stats = with_label_flags(filtered_df).groupby('country').agg(
+        Avg_Sentiment=('sentiment_score', 'mean'),
+        Sentiment_StdDev=('sentiment_score', 'std'),
+        Min_Sentiment=('sentiment_score', 'min'),
+        Max_Sentiment=('sentiment_score', 'max'),
+        Total_Articles=('sentiment_score', 'count'),
+        Positive_Count=('positive_count', 'sum'),
+        Negative_Count=('negative_count', 'sum'),
+        Neutral_Count=('neutral_count', 'sum'),
+    )
+    return finish_country_stats(country_stats)
+
+class FrameSentimentSource:
+    # In-memory source: every rollup is computed from the full article frame.
+    # sentiment_chunked.ChunkedSentimentSource answers the same calls from partial aggregates.
+    quartiles_available = True
+
+    def __init__(self, df):
+        self.df = df
+
+    def overview(self):
+        return len(self.df['month'].unique()), len(self.df['country'].unique()), len(self.df)
+
+    def country_counts(self):
+        return self.df['country'].value_counts()
+
+    def timeline(self, countries, time_granularity):
+        return build_timeline_data(self.df[self.df['country'].isin(countries)], time_granularity)
+
+    def country_stats(self, countries):
+        return build_country_stats(self.df[self.df['country'].isin(countries)])
+
+    def top_articles(self, n, largest=True):
+        df = self.df
+        top = df.nlargest(n, 'sentiment_score') if largest else df.nsmallest(n, 'sentiment_score')
+        return top[['title', 'sentiment_score'] + (['country'] if 'country' in df.columns else []) + (['publishedAt'] if 'publishedAt' in df.columns else [])]
+
+    def label_summary(self):
+        return self.df.groupby('sentiment_label')['sentiment_score'].describe()
+
+    def score_frame(self):
+        return self.df
+
+    def has_language(self):
+        return 'lang' in self.df.columns
+
+    def language_counts(self):
+        return self.df['lang'].value_counts()
+
+    def language_sentiment(self):
+        return self.df.groupby('lang')['sentiment_score'].mean().sort_values(ascending=False)
+
+def load_sentiment_source():
+    if SENTIMENT_CORPUS_PATH:
+        from sentiment_chunked import load_chunked_source
+        return load_chunked_source(SENTIMENT_CORPUS_PATH, SENTIMENT_MEMORY_BUDGET_MB)
+    return FrameSentimentSource(load_sentiment_data())
+
+# Rollups are cached per selection so background prefetch and other sessions can reuse them
+@shared_cache()
+def load_timeline_data(countries, time_granularity):
+    return load_sentiment_source().timeline(list(countries), time_granularity)
+
+@shared_cache()
+def load_country_stats(countries):
+    return load_sentiment_source().country_stats(list(countries))
+
+def default_countries(country_counts):
+    return country_counts.head(10).index.tolist()
+
+@shared_cache()
+def load_sentiment_findings():
+    # One batch over every country: (metric, country) x month, months without articles count as 0
+    source = load_sentiment_source()
+    timeline_data = source.timeline(source.country_counts().index.tolist(), "Monthly")
+    wide = timeline_data.pivot(index='country', columns='time_period', values=FINDING_METRICS)
+    months = pd.period_range(timeline_data['time_period'].min(), timeline_data['time_period'].max(), freq='M')
+    frames = {}
+    for metric in FINDING_METRICS:
+        frame = wide[metric].reindex(columns=months)
+        frames[metric] = frame if metric == 'avg_sentiment' else frame.fillna(0)
+    return detect(pd.concat(frames, names=['metric', 'country']))
+
+def findings_for(findings, metric, countries):
+    selected = findings[findings['series'].map(lambda key: key[0] == metric and key[1] in countries).astype(bool)].copy()
+    selected['country'] = [key[1] for key in selected['series']]
+    return selected
+
+def format_months(rows, value_format):
+    return ", ".join(f"**{row['period'].strftime('%b %Y')} ({value_format.format(row['value'])})**"
+                     for _, row in rows.sort_values('period').iterrows())
+
+def sentiment_summary_points(change_points, anomalies, country_counts):
+    # Generated from the detection findings, so the summary follows the data on every refresh
+    summary_points = []
+    for country in country_counts.head(SUMMARY_COUNTRIES).index:
+        volume_shifts = findings_for(change_points, 'article_count', [country])
+        if len(volume_shifts):
+            last = volume_shifts.iloc[-1]
+            direction = "increase" if last['shift'] > 0 else "decrease"
+            summary_points.append(
+                f"**{country}** shows a significant **{direction} in article volume** from **{last['period'].strftime('%b %Y')}** "
+                f"(about {last['before']:.0f} → {last['after']:.0f} articles a month)."
+            )
+        else:
+            summary_points.append(f"**{country}** shows **no lasting change in article volume** over the period.")
+
+        details = []
+        for metric, label in (('article_count', "articles"), ('negative_count', "negative articles"),
+                              ('positive_count', "positive articles")):
+            spikes = findings_for(anomalies, metric, [country])
+            spikes = spikes[spikes['z'] > 0]
+            if len(spikes):
+                details.append(f"- Unusually many {label} in {format_months(spikes, '{:.0f}')}.")
+        for _, row in findings_for(change_points, 'avg_sentiment', [country]).iterrows():
+            tone = "more positive" if row['shift'] > 0 else "more negative"
+            details.append(f"- Average sentiment turned **{tone}** from **{row['period'].strftime('%b %Y')}** "
+                           f"({row['before']:.3f} → {row['after']:.3f}).")
+        summary_points += details or ["- No unusual months or lasting sentiment shifts detected."]
+        summary_points.append("")
+    return summary_points
+
+def finding_annotations(timeline_data, findings, metric, value_column, text, directions):
+    # (x, y, text) tuples for the monthly charts: marked at the country's value in that month.
+    # directions = (word for an increase, word for a decrease), by the sign of z or shift
+    if findings is None or not len(findings):
+        return ()
+    marked = findings_for(findings, metric, set(timeline_data['country']))
+    marked['time_str'] = marked['period'].astype(str)
+    marked = marked.merge(timeline_data[['country', 'time_str', value_column]], on=['country', 'time_str'])
+    sign = 'z' if 'z' in marked.columns else 'shift'
+    return tuple((row['time_str'], row[value_column],
+                  text.format(country=row['country'], direction=directions[0] if row[sign] > 0 else directions[1]))
+                 for _, row in marked.iterrows())
+
+def add_annotations(fig, annotations):
+    for x, y, text in annotations:
+        fig.add_annotation(x=x, y=y, text=text, showarrow=True, arrowhead=2, font=dict(size=10))
+
+# Figure builders for the timeline section. Figures are cached as JSON by a hash of
+# timeline_data (see figures.py), so these only run when the rollup changes.
+def build_sentiment_timeline_figure(timeline_data, time_granularity, annotations=()):
     fig_main = px.line(
         timeline_data, 
         x='time_str', 
@@ -135,7 +233,7 @@ def display_country_timeline_sentiment_dashboard():
         title=f"Country Sentiment Trends - {time_granularity} View",
         labels={'time_str': f'{time_granularity}', 'avg_sentiment': 'Average Sentiment Score'},
         markers=True,
-        line_shape='spline'
+        **line_options(len(timeline_data))
     )
     
     # Add horizontal line at neutral (0)
@@ -156,12 +254,10 @@ def display_country_timeline_sentiment_dashboard():
                      "Avg Sentiment: %{y:.3f}<br>" +
                      "<extra></extra>"
     )
-    
-    st.plotly_chart(fig_main, use_container_width=True)
-    
-    # === 2. ARTICLE VOLUME TIMELINE (FULL WIDTH) ===
-    st.subheader("📰 Article Volume by Country Over Time")
-    
+    add_annotations(fig_main, annotations)
+    return fig_main
+
+def build_article_volume_figure(timeline_data, time_granularity, annotations=()):
     fig_volume = px.bar(
         timeline_data,
         x='time_str',
@@ -177,6 +273,111 @@ def display_country_timeline_sentiment_dashboard():
         hovermode='x unified',
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
     )
+    add_annotations(fig_volume, annotations)
+    return fig_volume
+
+def build_sentiment_distribution_figure(timeline_data, countries, time_granularity):
+    # Create subplot for positive and negative percentages
+    fig_sentiment_dist = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=('Positive Sentiment Percentage', 'Negative Sentiment Percentage'),
+        vertical_spacing=0.1
+    )
+    
+    # Add positive sentiment traces
+    n_points = 2 * len(timeline_data)
+    for country in countries:
+        country_data = timeline_data[timeline_data['country'] == country]
+        fig_sentiment_dist.add_trace(
+            scatter_trace(
+                n_points,
+                x=country_data['time_str'],
+                y=country_data['positive_pct'],
+                mode='lines+markers',
+                name=f"{country} - Positive",
+                line=dict(width=2),
+                showlegend=True
+            ),
+            row=1, col=1
+        )
+        
+        fig_sentiment_dist.add_trace(
+            scatter_trace(
+                n_points,
+                x=country_data['time_str'],
+                y=country_data['negative_pct'],
+                mode='lines+markers',
+                name=f"{country} - Negative",
+                line=dict(width=2, dash='dash'),
+                showlegend=True
+            ),
+            row=2, col=1
+        )
+    
+    fig_sentiment_dist.update_xaxes(title_text=f"{time_granularity}", row=2, col=1)
+    fig_sentiment_dist.update_yaxes(title_text="Positive %", row=1, col=1)
+    fig_sentiment_dist.update_yaxes(title_text="Negative %", row=2, col=1)
+    
+    fig_sentiment_dist.update_layout(
+        height=800,
+        title_text="Sentiment Distribution Over Time by Country",
+        hovermode='x unified'
+    )
+    return fig_sentiment_dist
+
+def build_label_box_figure(score_df):
+    summary, outliers = box_summary(score_df, 'sentiment_label', 'sentiment_score')
+    return box_figure(
+        summary, outliers, 'sentiment_label', 'sentiment_score',
+        title="Sentiment Score Distribution by Label",
+        color_map={
+            'positive': '#2E8B57',
+            'neutral': '#FFD700',
+            'negative': '#DC143C'
+        }
+    )
+
+# The page is split into Streamlit fragments so a widget change reruns only what reads it:
+#   render_country_analysis  - country multiselect -> country table, rankings, stats export
+#   render_timeline_section  - granularity selectbox -> timeline charts, timeline export
+# Overview metrics, the article insight tabs and the summary do not depend on either widget
+# and are only rendered on full-page runs. Fragments are wrapped at call time with
+# st.fragment(...) so report_builder's headless recorder can stand in for st.
+def render_timeline_section(countries):
+    # Time granularity selection
+    time_granularity = st.selectbox(
+        "Time Granularity:",
+        ["Monthly", "Quarterly", "Yearly"],
+        index=0,
+        key="timeline_granularity"
+    )
+    
+    # === MAIN TIMELINE VISUALIZATION ===
+    st.header("📈 Country Sentiment Timeline - Full Analysis")
+    
+    timeline_data = load_timeline_data(countries, time_granularity)
+    
+    # Detected shifts and spikes are marked on the monthly view (see detection.py)
+    change_points, anomalies = load_sentiment_findings() if time_granularity == "Monthly" else (None, None)
+    
+    # === 1. MAIN SENTIMENT TIMELINE (FULL WIDTH) ===
+    st.subheader("🌍 Average Sentiment Score by Country Over Time")
+    
+    fig_main = cached_figure('sentiment_timeline', timeline_data, build_sentiment_timeline_figure,
+                             time_granularity=time_granularity,
+                             annotations=finding_annotations(timeline_data, change_points, 'avg_sentiment',
+                                                             'avg_sentiment', "{country}: shift {direction}",
+                                                             ("up", "down")))
+    st.plotly_chart(fig_main, use_container_width=True)
+    
+    # === 2. ARTICLE VOLUME TIMELINE (FULL WIDTH) ===
+    st.subheader("📰 Article Volume by Country Over Time")
+    
+    fig_volume = cached_figure('article_volume', timeline_data, build_article_volume_figure,
+                               time_granularity=time_granularity,
+                               annotations=finding_annotations(timeline_data, anomalies, 'article_count',
+                                                               'article_count', "{country}: {direction}",
+                                                               ("spike", "drop")))
     
     st.plotly_chart(fig_volume, use_container_width=True)
     
@@ -231,157 +432,49 @@ def display_country_timeline_sentiment_dashboard():
     # === 5. POSITIVE/NEGATIVE SENTIMENT PERCENTAGES (FULL WIDTH) ===
     st.subheader("📊 Sentiment Distribution Timeline")
     
-    # Create subplot for positive and negative percentages
-    fig_sentiment_dist = make_subplots(
-        rows=2, cols=1,
-        subplot_titles=('Positive Sentiment Percentage', 'Negative Sentiment Percentage'),
-        vertical_spacing=0.1
-    )
+    fig_sentiment_dist = cached_figure('sentiment_distribution', timeline_data, build_sentiment_distribution_figure,
+                                       countries=countries, time_granularity=time_granularity)
     
-    # Add positive sentiment traces
-    for country in selected_countries:
-        country_data = timeline_data[timeline_data['country'] == country]
-        fig_sentiment_dist.add_trace(
-            go.Scatter(
-                x=country_data['time_str'],
-                y=country_data['positive_pct'],
-                mode='lines+markers',
-                name=f"{country} - Positive",
-                line=dict(width=2),
-                showlegend=True
-            ),
-            row=1, col=1
-        )
-        
-        fig_sentiment_dist.add_trace(
-            go.Scatter(
-                x=country_data['time_str'],
-                y=country_data['negative_pct'],
-                mode='lines+markers',
-                name=f"{country} - Negative",
-                line=dict(width=2, dash='dash'),
-                showlegend=True
-            ),
-            row=2, col=1
-        )
+    st.plotly_chart(fig_sentiment_dist, use_container_width=True)
     
-    fig_sentiment_dist.update_xaxes(title_text=f"{time_granularity}", row=2, col=1)
-    fig_sentiment_dist.update_yaxes(title_text="Positive %", row=1, col=1)
-    fig_sentiment_dist.update_yaxes(title_text="Negative %", row=2, col=1)
+    # Export timeline data
+    timeline_csv = timeline_data.to_csv(index=False)
+    st.download_button(
+        label="📊 Download Timeline Data",
+        data=timeline_csv,
+        file_name=f"country_sentiment_timeline_{datetime.now().strftime('%Y%m%d')}.csv",
+        mime="text/csv"
+    )
+
+def render_country_analysis(source):
+    # === COUNTRY SELECTION ===
+    st.header("🎯 Country Selection & Filtering")
     
-    fig_sentiment_dist.update_layout(
-        height=800,
-        title_text="Sentiment Distribution Over Time by Country",
-        hovermode='x unified'
+    # Get countries sorted by article count
+    country_counts = source.country_counts()
+    
+    # Multi-select for countries with smart defaults (top 10)
+    selected_countries = st.multiselect(
+        "Select countries to analyze (default: top 10 by article count):",
+        options=country_counts.index.tolist(),
+        default=default_countries(country_counts),
+        key="country_timeline_selector"
     )
     
-    st.plotly_chart(fig_sentiment_dist, use_container_width=True)
+    if not selected_countries:
+        st.warning("Please select at least one country to analyze.")
+        return
+    countries = tuple(selected_countries)
+    
+    st.fragment(render_timeline_section)(countries)
     
     # === DETAILED COUNTRY COMPARISON TABLE ===
     st.header("📋 Detailed Country Timeline Statistics")
     
-    # Create comprehensive country statistics
-    country_stats = filtered_df.groupby('country').agg({
-        'sentiment_score': ['mean', 'std', 'min', 'max', 'count'],
-        'sentiment_label': [
-            lambda x: (x == 'positive').sum(),
-            lambda x: (x == 'negative').sum(),
-            lambda x: (x == 'neutral').sum()
-        ]
-    }).round(4)
-    
-    # Flatten column names
-    country_stats.columns = [
-        'Avg_Sentiment', 'Sentiment_StdDev', 'Min_Sentiment', 'Max_Sentiment', 'Total_Articles',
-        'Positive_Count', 'Negative_Count', 'Neutral_Count'
-    ]
-    
-    # Add percentage and derived metrics
-    country_stats['Positive_Pct'] = (country_stats['Positive_Count'] / country_stats['Total_Articles'] * 100).round(1)
-    country_stats['Negative_Pct'] = (country_stats['Negative_Count'] / country_stats['Total_Articles'] * 100).round(1)
-    country_stats['Neutral_Pct'] = (country_stats['Neutral_Count'] / country_stats['Total_Articles'] * 100).round(1)
-    country_stats['Sentiment_Range'] = (country_stats['Max_Sentiment'] - country_stats['Min_Sentiment']).round(4)
-    country_stats['Volatility_Score'] = (country_stats['Sentiment_StdDev'] / country_stats['Total_Articles'] * 1000).round(2)
-    
-    # Add dominant sentiment
-    country_stats['Dominant_Sentiment'] = country_stats[['Positive_Count', 'Negative_Count', 'Neutral_Count']].idxmax(axis=1)
-    country_stats['Dominant_Sentiment'] = country_stats['Dominant_Sentiment'].str.replace('_Count', '').str.lower()
-    
-    # Sort by average sentiment
-    country_stats = country_stats.sort_values('Avg_Sentiment', ascending=False)
+    country_stats = load_country_stats(countries)
     
     st.dataframe(country_stats, use_container_width=True)
 
-    # === DETAILED INSIGHTS ===
-    st.header("🔍 Detailed Insights")
-    
-    tab1, tab2, tab3 = st.tabs(["Top Articles", "Statistics", "Language Analysis"])
-    
-    with tab1:
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("Most Positive Articles")
-            top_positive = df.nlargest(5, 'sentiment_score')[['title', 'sentiment_score'] + (['country'] if 'country' in df.columns else []) + (['publishedAt'] if 'publishedAt' in df.columns else [])]
-            for idx, row in top_positive.iterrows():
-                country_text = f" | {row['country']}" if 'country' in row else ""
-                with st.expander(f"Score: {row['sentiment_score']:.3f}{country_text}"):
-                    st.write(f"**Title:** {row['title']}")
-                    if 'publishedAt' in row:
-                        st.write(f"**Date:** {row['publishedAt'].strftime('%Y-%m-%d')}")
-        
-        with col2:
-            st.subheader("Most Negative Articles")
-            top_negative = df.nsmallest(5, 'sentiment_score')[['title', 'sentiment_score'] + (['country'] if 'country' in df.columns else []) + (['publishedAt'] if 'publishedAt' in df.columns else [])]
-            for idx, row in top_negative.iterrows():
-                country_text = f" | {row['country']}" if 'country' in row else ""
-                with st.expander(f"Score: {row['sentiment_score']:.3f}{country_text}"):
-                    st.write(f"**Title:** {row['title']}")
-                    if 'publishedAt' in row:
-                        st.write(f"**Date:** {row['publishedAt'].strftime('%Y-%m-%d')}")
-    
-    with tab2:
-        st.subheader("Statistical Summary")
-        
-        # Summary by sentiment label
-        stats_summary = df.groupby('sentiment_label')['sentiment_score'].describe()
-        st.dataframe(stats_summary)
-        
-        # Box plot
-        fig_box = px.box(
-            df, x='sentiment_label', y='sentiment_score',
-            title="Sentiment Score Distribution by Label",
-            color='sentiment_label',
-            color_discrete_map={
-                'positive': '#2E8B57',
-                'neutral': '#FFD700',
-                'negative': '#DC143C'
-            }
-        )
-        st.plotly_chart(fig_box, use_container_width=True)
-    
-    with tab3:
-        if 'lang' in df.columns:
-            st.subheader("Analysis by Language")
-            
-            # Language distribution
-            lang_counts = df['lang'].value_counts()
-            fig_lang = px.bar(
-                x=lang_counts.index,
-                y=lang_counts.values,
-                title="Number of Articles by Language",
-                labels={'x': 'Language', 'y': 'Article Count'}
-            )
-            st.plotly_chart(fig_lang, use_container_width=True)
-            
-            # Sentiment by language
-            lang_sentiment = df.groupby('lang')['sentiment_score'].mean().sort_values(ascending=False)
-            st.write("**Average Sentiment Score by Language:**")
-            for lang, score in lang_sentiment.items():
-                st.write(f"- {lang}: {score:.3f}")
-        else:
-            st.info("No language data available for analysis.")
-
     col1, col2 = st.columns(2)
     
     with col1:
@@ -458,53 +551,130 @@ def display_country_timeline_sentiment_dashboard():
     # === EXPORT SECTION ===
     st.header("📥 Export Timeline Analysis")
     
-    col1, col2 = st.columns(2)
+    # Export country statistics
+    country_stats_csv = country_stats.to_csv()
+    st.download_button(
+        label="📋 Download Country Statistics",
+        data=country_stats_csv,
+        file_name=f"country_sentiment_stats_{datetime.now().strftime('%Y%m%d')}.csv",
+        mime="text/csv"
+    )
+
+def render_article_insights(source):
+    # === DETAILED INSIGHTS ===
+    st.header("🔍 Detailed Insights")
     
-    with col1:
-        # Export timeline data
-        timeline_export = timeline_data.drop('sentiment_breakdown', axis=1)
-        timeline_csv = timeline_export.to_csv(index=False)
-        st.download_button(
-            label="📊 Download Timeline Data",
-            data=timeline_csv,
-            file_name=f"country_sentiment_timeline_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+    tab1, tab2, tab3 = st.tabs(["Top Articles", "Statistics", "Language Analysis"])
+    
+    with tab1:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("Most Positive Articles")
+            top_positive = source.top_articles(5, largest=True)
+            for idx, row in top_positive.iterrows():
+                country_text = f" | {row['country']}" if 'country' in row else ""
+                with st.expander(f"Score: {row['sentiment_score']:.3f}{country_text}"):
+                    st.write(f"**Title:** {row['title']}")
+                    if 'publishedAt' in row:
+                        st.write(f"**Date:** {row['publishedAt'].strftime('%Y-%m-%d')}")
+        
+        with col2:
+            st.subheader("Most Negative Articles")
+            top_negative = source.top_articles(5, largest=False)
+            for idx, row in top_negative.iterrows():
+                country_text = f" | {row['country']}" if 'country' in row else ""
+                with st.expander(f"Score: {row['sentiment_score']:.3f}{country_text}"):
+                    st.write(f"**Title:** {row['title']}")
+                    if 'publishedAt' in row:
+                        st.write(f"**Date:** {row['publishedAt'].strftime('%Y-%m-%d')}")
+    
+    with tab2:
+        st.subheader("Statistical Summary")
+        
+        # Summary by sentiment label
+        stats_summary = source.label_summary()
+        st.dataframe(stats_summary)
+        
+        # Box plot
+        score_df = source.score_frame()
+        if score_df is None:
+            st.info("Quartiles and the box plot need every score in memory and are not available in out-of-core mode.")
+        else:
+            # Quartiles, whiskers and a sample of outliers instead of every article's score
+            fig_box = cached_figure('label_box', score_df[['sentiment_label', 'sentiment_score']], build_label_box_figure)
+            st.plotly_chart(fig_box, use_container_width=True)
+    
+    with tab3:
+        if source.has_language():
+            st.subheader("Analysis by Language")
+            
+            # Language distribution
+            lang_counts = source.language_counts()
+            fig_lang = px.bar(
+                x=lang_counts.index,
+                y=lang_counts.values,
+                title="Number of Articles by Language",
+                labels={'x': 'Language', 'y': 'Article Count'}
+            )
+            st.plotly_chart(fig_lang, use_container_width=True)
+            
+            # Sentiment by language
+            lang_sentiment = source.language_sentiment()
+            st.write("**Average Sentiment Score by Language:**")
+            for lang, score in lang_sentiment.items():
+                st.write(f"- {lang}: {score:.3f}")
+        else:
+            st.info("No language data available for analysis.")
+
+def display_country_timeline_sentiment_dashboard():
+    st.title("🌍 Country Sentiment Timeline Analysis - Tariff News")
     
+    if SENTIMENT_CORPUS_PATH:
+        try:
+            source = load_sentiment_source()
+        except ValueError as e:
+            st.error(f"Could not aggregate the article corpus: {e}")
+            return
+    else:
+        df = load_sentiment_data()
+        
+        if 'sentiment_score' not in df.columns:
+            st.error("Please run sentiment analysis first!")
+            return
+        
+        if 'country' not in df.columns:
+            st.warning("No 'country' column found. Country analysis cannot be performed.")
+            return
+        
+        source = FrameSentimentSource(df)
+    
+    # === OVERVIEW METRICS ===
+    st.header("📊 Timeline Overview")
+    
+    # Time range info
+    # date_range = f"{df['publishedAt'].min().strftime('%Y-%m-%d')} to {df['publishedAt'].max().strftime('%Y-%m-%d')}"
+    total_months, total_countries, total_articles = source.overview()
+    
+    col1, col2, col3 = st.columns(3)
+    # with col1:
+    #     st.metric("Date Range", date_range)
+    with col1:
+        st.metric("Total Months", total_months)
     with col2:
-        # Export country statistics
-        country_stats_csv = country_stats.to_csv()
-        st.download_button(
-            label="📋 Download Country Statistics",
-            data=country_stats_csv,
-            file_name=f"country_sentiment_stats_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+        st.metric("Countries Analyzed", total_countries)
+    with col3:
+        st.metric("Total Articles", total_articles)
+    
+    st.fragment(render_country_analysis)(source)
+    
+    render_article_insights(source)
     
     # Display Summary in Point Form
     st.header("Summary")
 
-    summary_points = [
-        "**Canada** shows a significant **increase in article volume** starting from late 2024.",
-        "- Very high negative sentiment in **Nov 2024 to Mar 2025** (e.g. 71, 80, 49, 46, 80 negative articles).",
-        "- Positive sentiment also increased in the same period, peaking in **Feb 2025** with **55 positive articles**.",
-        "- This suggests a surge of both **controversial and optimistic news** around that time.",
-        "",
-        "**China** maintains a relatively **balanced sentiment profile**:",
-        "- Negative, neutral, and positive articles are distributed more evenly.",
-        "- Noticeable **growth in neutral and positive sentiment** in **2024-2025**, especially **Feb 2025** with **36 neutral** and **34 positive** articles.",
-        "- Low overall negative sentiment compared to other countries.",
-        "",
-        "**Germany** consistently has a **high volume of articles** every month:",
-        "- Across all months, **positive articles generally outnumber negative ones**.",
-        "- Peaks of positive sentiment observed in **2022-03 (75)**, **2023-03 (75)**, and **2023-05 (77)**.",
-        "- Negative sentiment is stable but lower than positive in most months.",
-        "",
-        "**US** sentiment is **more volatile**:",
-        "- Spikes in negative sentiment in **Nov 2024 (59 negative)** and **Jan 2025 (70 negative)**.",
-        "- Positive sentiment increased notably during the same periods, but still **lags behind negative sentiment** in early 2025.",
-        "- A general pattern of **polarized sentiment** emerges toward late 2024 and early 2025."
-    ]
+    change_points, anomalies = load_sentiment_findings()
+    summary_points = sentiment_summary_points(change_points, anomalies, source.country_counts())
 
     # Print each point
     for point in summary_points:
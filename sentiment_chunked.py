@@ -0,0 +1,241 @@
+# sentiment_chunked.py
+# Out-of-core aggregation for article corpora that do not fit in memory.
+#
+# The corpus (a CSV file/URL, a Parquet file or a partitioned Parquet directory) is read in
+# chunks sized from a memory budget, projecting only the columns the rollups need. Each chunk
+# is reduced to mergeable partial aggregates per (country, month): row count, score count,
+# score sum, M2 (sum of squared deviations), min, max and label counts. Partials are merged
+# with Chan's parallel variance formula, and the quarterly/yearly/per-country rollups are
+# derived from the monthly partials, so the raw corpus is never held in memory at once.
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_cache import shared_cache
+from sentiment import SENTIMENT_LABELS, finish_timeline_data, finish_country_stats
+
+CORPUS_COLUMNS = ['publishedAt', 'country', 'sentiment_score', 'sentiment_label', 'lang']
+TITLE_COLUMNS = ['title']
+# Read when the corpus has them; the language and top-article views are skipped otherwise
+OPTIONAL_COLUMNS = ['lang', 'title']
+TOP_ARTICLES = 5
+# Parsing and groupby temporaries take a few times the resident size of a chunk
+CHUNK_OVERHEAD_FACTOR = 4
+MIN_CHUNK_ROWS = 1_000
+SAMPLE_ROWS = 2_000
+
+COUNT_COLUMNS = ['rows'] + [f'{label}_count' for label in SENTIMENT_LABELS]
+
+
+# === READING ===
+def chunk_rows_for_budget(sample, memory_budget_bytes):
+    bytes_per_row = max(sample.memory_usage(deep=True).sum() / max(len(sample), 1), 1)
+    return max(int(memory_budget_bytes / (bytes_per_row * CHUNK_OVERHEAD_FACTOR)), MIN_CHUNK_ROWS)
+
+
+def present_columns(columns, available):
+    missing = [c for c in columns if c not in available and c not in OPTIONAL_COLUMNS]
+    if missing:
+        raise ValueError(f"Corpus is missing columns {missing}")
+    return [c for c in columns if c in available]
+
+
+def is_columnar(path):
+    return os.path.isdir(path) or path.endswith('.parquet')
+
+
+def iter_corpus_chunks(path, columns, memory_budget_bytes):
+    if is_columnar(path):
+        try:
+            import pyarrow.dataset as ds
+        except ImportError:
+            raise ValueError("Reading a Parquet corpus needs pyarrow installed")
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        columns = present_columns(columns, dataset.schema.names)
+        sample = dataset.head(SAMPLE_ROWS, columns=columns).to_pandas()
+        batch_size = chunk_rows_for_budget(sample, memory_budget_bytes)
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+            yield batch.to_pandas()
+    else:
+        sample = pd.read_csv(path, nrows=SAMPLE_ROWS, encoding='ISO-8859-1')
+        columns = present_columns(columns, sample.columns)
+        sample = sample[columns]
+        chunksize = chunk_rows_for_budget(sample, memory_budget_bytes)
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize, encoding='ISO-8859-1')
+
+
+# === PARTIAL AGGREGATES ===
+def chunk_partials(chunk, keys):
+    grouped = chunk.assign(
+        rows=1, **{f'{label}_count': chunk['sentiment_label'] == label for label in SENTIMENT_LABELS}
+    ).groupby(keys, dropna=False, sort=False)
+    partials = grouped.agg(
+        n=('sentiment_score', 'count'),
+        total=('sentiment_score', 'sum'),
+        var=('sentiment_score', 'var'),
+        min=('sentiment_score', 'min'),
+        max=('sentiment_score', 'max'),
+        **{column: (column, 'sum') for column in COUNT_COLUMNS},
+    )
+    partials['m2'] = (partials.pop('var') * (partials['n'] - 1)).fillna(0.0)
+    return partials
+
+
+def merge_partials(partials, keys):
+    # Chan et al.: M2 = sum(M2_i) + sum(n_i * (mean_i - mean)^2), vectorised over every group
+    parts = partials.reset_index(drop=partials.index.names == [None])
+    grouped = parts.groupby(keys, dropna=False, sort=False)
+    group_n = grouped['n'].transform('sum')
+    group_mean = grouped['total'].transform('sum') / group_n.where(group_n > 0)
+    part_mean = parts['total'] / parts['n'].where(parts['n'] > 0)
+    parts['spread'] = (parts['n'] * (part_mean - group_mean) ** 2).fillna(0.0)
+
+    merged = parts.groupby(keys, dropna=False, sort=False).agg(
+        n=('n', 'sum'),
+        total=('total', 'sum'),
+        m2=('m2', 'sum'),
+        spread=('spread', 'sum'),
+        min=('min', 'min'),
+        max=('max', 'max'),
+        **{column: (column, 'sum') for column in COUNT_COLUMNS if column in parts.columns},
+    )
+    merged['m2'] = merged['m2'] + merged.pop('spread')
+    return merged
+
+
+def finish_moments(merged):
+    n = merged['n']
+    mean = merged['total'] / n.where(n > 0)
+    std = np.sqrt(merged['m2'] / (n - 1).where(n > 1))
+    return mean, std
+
+
+class ChunkedSentimentSource:
+    # Answers the same calls as sentiment.FrameSentimentSource from merged partials
+    quartiles_available = False
+
+    def __init__(self):
+        self.by_month = None     # (country, month) partials
+        self.by_label = None     # sentiment_label partials
+        self.by_lang = None      # lang partials
+        self.total_rows = 0
+        self.top = []            # candidate rows for the most positive / negative articles
+        self.has_lang = False
+
+    def add_chunk(self, chunk):
+        chunk = chunk.copy()
+        chunk['publishedAt'] = pd.to_datetime(chunk['publishedAt'], errors='coerce')
+        chunk['month'] = chunk['publishedAt'].dt.to_period('M')
+        self.total_rows += len(chunk)
+        self.by_month = self._merge(self.by_month, chunk_partials(chunk, ['country', 'month']), ['country', 'month'])
+        self.by_label = self._merge(self.by_label, chunk_partials(chunk, ['sentiment_label']), ['sentiment_label'])
+        if 'lang' in chunk.columns:
+            self.has_lang = True
+            self.by_lang = self._merge(self.by_lang, chunk_partials(chunk, ['lang']), ['lang'])
+        if 'title' in chunk.columns:
+            # Only candidates are kept; earlier chunks come first so ties resolve like DataFrame.nlargest
+            largest = chunk.nlargest(TOP_ARTICLES, 'sentiment_score')
+            smallest = chunk.nsmallest(TOP_ARTICLES, 'sentiment_score')
+            if self.top:
+                largest = pd.concat([self.top[0], largest]).nlargest(TOP_ARTICLES, 'sentiment_score')
+                smallest = pd.concat([self.top[1], smallest]).nsmallest(TOP_ARTICLES, 'sentiment_score')
+            self.top = [largest, smallest]
+
+    @staticmethod
+    def _merge(current, partials, keys):
+        if current is None:
+            return partials
+        return merge_partials(pd.concat([current, partials]), keys)
+
+    # --- overview ---
+    def overview(self):
+        index = self.by_month.index
+        return index.get_level_values('month').nunique(dropna=False), index.get_level_values('country').nunique(dropna=False), self.total_rows
+
+    def country_counts(self):
+        rows = self.by_month['rows'].groupby(level='country').sum()
+        return rows.sort_values(ascending=False, kind='stable').rename('count')
+
+    # --- rollups ---
+    def _rollup(self, countries, keys):
+        parts = self.by_month.reset_index()
+        parts = parts[parts['country'].isin(countries)]
+        return merge_partials(parts, keys)
+
+    def timeline(self, countries, time_granularity):
+        parts = self.by_month.reset_index()
+        parts = parts[parts['country'].isin(countries) & parts['month'].notna()]
+        if time_granularity == "Quarterly":
+            parts['time_period'] = parts['month'].dt.asfreq('Q')
+        elif time_granularity == "Yearly":
+            parts['time_period'] = parts['month'].dt.to_timestamp().dt.year
+        else:
+            parts['time_period'] = parts['month']
+        merged = merge_partials(parts.drop(columns='month'), ['country', 'time_period']).sort_index()
+        mean, std = finish_moments(merged)
+        timeline_data = pd.DataFrame({
+            'avg_sentiment': mean,
+            'sentiment_std': std,
+            'article_count': merged['n'],
+            'positive_count': merged['positive_count'],
+            'negative_count': merged['negative_count'],
+            'neutral_count': merged['neutral_count'],
+        }).reset_index()
+        return finish_timeline_data(timeline_data)
+
+    def country_stats(self, countries):
+        merged = self._rollup(countries, ['country']).sort_index()
+        mean, std = finish_moments(merged)
+        country_stats = pd.DataFrame({
+            'Avg_Sentiment': mean,
+            'Sentiment_StdDev': std,
+            'Min_Sentiment': merged['min'],
+            'Max_Sentiment': merged['max'],
+            'Total_Articles': merged['n'],
+            'Positive_Count': merged['positive_count'],
+            'Negative_Count': merged['negative_count'],
+            'Neutral_Count': merged['neutral_count'],
+        })
+        return finish_country_stats(country_stats)
+
+    def top_articles(self, n, largest=True):
+        if not self.top:
+            return pd.DataFrame(columns=['title', 'sentiment_score', 'country', 'publishedAt'])
+        top = self.top[0].nlargest(n, 'sentiment_score') if largest else self.top[1].nsmallest(n, 'sentiment_score')
+        return top[['title', 'sentiment_score', 'country', 'publishedAt']]
+
+    def label_summary(self):
+        merged = self.by_label[self.by_label.index.notna()].sort_index()
+        mean, std = finish_moments(merged)
+        return pd.DataFrame({'count': merged['n'].astype(float), 'mean': mean, 'std': std, 'min': merged['min'], 'max': merged['max']})
+
+    def score_frame(self):
+        return None
+
+    def has_language(self):
+        return self.has_lang
+
+    def language_counts(self):
+        rows = self.by_lang['rows']
+        return rows[rows.index.notna()].sort_values(ascending=False, kind='stable').rename('count')
+
+    def language_sentiment(self):
+        merged = self.by_lang[self.by_lang.index.notna()]
+        mean, _ = finish_moments(merged)
+        return mean.rename('sentiment_score').sort_values(ascending=False)
+
+
+def aggregate_corpus(path, memory_budget_mb, include_titles=True):
+    columns = CORPUS_COLUMNS + (TITLE_COLUMNS if include_titles else [])
+    source = ChunkedSentimentSource()
+    for chunk in iter_corpus_chunks(path, columns, memory_budget_mb * 1024 * 1024):
+        source.add_chunk(chunk)
+    if source.by_month is None:
+        raise ValueError(f"No articles found in {path}")
+    return source
+
+
+@shared_cache()
+def load_chunked_source(path, memory_budget_mb):
+    return aggregate_corpus(path, memory_budget_mb)
@@ -0,0 +1,311 @@
+# similarity.py
+# Which partners and HS codes moved alike? All-pairs similarity and clustering of the
+# trade-balance trajectories in the combined_{HS}_{CN,US}.csv files.
+#
+# Every (HS code, reporter, partner) series is z-normalised so shape is compared, not size.
+# Two distances are available:
+#   - correlation distance, 1 - Pearson r, one matrix product over all series;
+#   - DTW with a Sakoe-Chiba band of DTW_WINDOW_MONTHS, so a partner that reacted a month or
+#     two later still matches. The dynamic programme runs over all pairs at once as numpy
+#     vectors (O(pairs * months * band) instead of O(pairs * months^2) Python steps), and large
+#     pair sets are split across processes.
+# Series are clustered by average linkage (implemented here with the Lance-Williams update,
+# since scipy is not a dependency). Nearest-neighbour queries rank candidates by LB_Keogh and
+# stop computing exact DTW once the bound exceeds the k-th best distance found so far.
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from data_cache import shared_cache
+from data_cleaning import HS_CODES
+from EDA import load_trade_aggregates
+
+SIMILARITY_RESOLUTIONS = ["Monthly", "Trailing 12M"]
+METRICS = ["DTW", "Correlation"]
+DTW_WINDOW_MONTHS = 3
+MIN_MONTHS = 24
+PAIR_BATCH = 50_000
+# Below this many pairs one process is faster than starting a pool
+PARALLEL_MIN_PAIRS = 20_000
+NEIGHBOUR_BATCH = 16
+DEFAULT_CLUSTERS = 6
+
+
+# === SERIES ===
+def series_matrix(resolution):
+    # (HS code, reporter, partner) x month, z-normalised; gaps are interpolated along time
+    frames = {}
+    for hs in HS_CODES:
+        for reporter, aggregates in zip(("CN", "US"), load_trade_aggregates(hs)):
+            frames[(hs, reporter)] = aggregates.frame(resolution)
+    wide = pd.concat(frames, names=["hs", "reporter", "partner"]).dropna(axis=1, how="all")
+    wide = wide[wide.notna().sum(axis=1) >= MIN_MONTHS]
+    wide = wide.interpolate(axis=1, limit_direction="both")
+    std = wide.std(axis=1, ddof=0)
+    wide = wide[std > 0]
+    return wide.sub(wide.mean(axis=1), axis=0).div(std[std > 0], axis=0)
+
+
+def series_label(key):
+    hs, reporter, partner = key
+    return f"HS{hs} {reporter} - {partner}"
+
+
+# === DISTANCES ===
+def correlation_distances(values):
+    # Rows are z-normalised with ddof=0, so r = z . z' / m
+    r = values @ values.T / values.shape[1]
+    return np.clip(1.0 - r, 0.0, 2.0)
+
+
+def dtw_pairs(a, b, window, limit=np.inf):
+    # Banded DTW between a[k] and b[k] for every k at once (squared-difference cost).
+    # Pairs whose best partial path already exceeds `limit` are abandoned and returned as inf.
+    pairs, m = a.shape
+    result = np.full(pairs, np.inf)
+    alive = np.arange(pairs)
+    prev = np.full((pairs, m + 1), np.inf)
+    prev[:, 0] = 0.0
+    limit_sq = limit ** 2
+    for i in range(1, m + 1):
+        lo, hi = max(1, i - window), min(m, i + window)
+        cost = (a[:, i - 1, None] - b[:, lo - 1:hi]) ** 2
+        cur = np.full_like(prev, np.inf)
+        for j in range(lo, hi + 1):
+            cur[:, j] = cost[:, j - lo] + np.minimum(np.minimum(prev[:, j - 1], prev[:, j]), cur[:, j - 1])
+        if np.isfinite(limit_sq):
+            keep = cur[:, lo:hi + 1].min(axis=1) <= limit_sq
+            if not keep.all():
+                alive, a, b, cur = alive[keep], a[keep], b[keep], cur[keep]
+                if not len(alive):
+                    return result
+        prev = cur
+    result[alive] = np.sqrt(prev[:, m])
+    return result
+
+
+def dtw_pair_batches(values, first, second, window):
+    return np.concatenate([
+        dtw_pairs(values[first[s:s + PAIR_BATCH]], values[second[s:s + PAIR_BATCH]], window)
+        for s in range(0, len(first), PAIR_BATCH)
+    ])
+
+
+def dtw_distances(values, window=DTW_WINDOW_MONTHS, workers=None):
+    n = len(values)
+    first, second = np.triu_indices(n, 1)
+    workers = workers or os.cpu_count() or 1
+    if len(first) < PARALLEL_MIN_PAIRS or workers == 1:
+        upper = dtw_pair_batches(values, first, second, window)
+    else:
+        chunks = np.array_split(np.arange(len(first)), workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(dtw_pair_batches, [values] * workers, [first[c] for c in chunks],
+                             [second[c] for c in chunks], [window] * workers)
+            upper = np.concatenate(list(parts))
+    distances = np.zeros((n, n))
+    distances[first, second] = upper
+    distances[second, first] = upper
+    return distances
+
+
+def envelopes(values, window):
+    padded = np.pad(values, ((0, 0), (window, window)), mode="edge")
+    views = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1, axis=1)
+    return views.max(axis=2), views.min(axis=2)
+
+
+def lb_keogh(query, upper, lower):
+    # Lower bound on banded DTW from `query` to each candidate with envelope (upper, lower)
+    above = np.clip(query - upper, 0.0, None)
+    below = np.clip(lower - query, 0.0, None)
+    return np.sqrt((above ** 2 + below ** 2).sum(axis=-1))
+
+
+def nearest_series(values, query, k=5, window=DTW_WINDOW_MONTHS):
+    # Exact DTW k-NN of row `query`; returns (indices, distances, exact DTW computations)
+    upper, lower = envelopes(values, window)
+    q_upper, q_lower = upper[query], lower[query]
+    # Both directions are valid bounds, so take the tighter one
+    bound = np.maximum(lb_keogh(values[query], upper, lower), lb_keogh(values, q_upper, q_lower))
+    order = np.argsort(bound, kind="stable")
+    order = order[order != query]
+
+    best_idx, best_dist = np.array([], dtype=int), np.array([])
+    computed = 0
+    for start in range(0, len(order), NEIGHBOUR_BATCH):
+        limit = best_dist[k - 1] if len(best_dist) >= k else np.inf
+        batch = order[start:start + NEIGHBOUR_BATCH]
+        batch = batch[bound[batch] <= limit]
+        if not len(batch):
+            break
+        dist = dtw_pairs(np.repeat(values[[query]], len(batch), axis=0), values[batch], window, limit)
+        computed += len(batch)
+        best_idx = np.concatenate([best_idx, batch])
+        best_dist = np.concatenate([best_dist, dist])
+        keep = np.argsort(best_dist, kind="stable")[:k]
+        best_idx, best_dist = best_idx[keep], best_dist[keep]
+    return best_idx, best_dist, computed
+
+
+# === CLUSTERING ===
+def average_linkage(distances):
+    # scipy-style linkage rows: (cluster a, cluster b, distance, size); merged clusters get ids n, n+1, ...
+    n = len(distances)
+    d = distances.astype(float)
+    np.fill_diagonal(d, np.inf)
+    size = np.ones(n)
+    cluster = np.arange(n)
+    linkage = np.zeros((n - 1, 4))
+    for step in range(n - 1):
+        i, j = sorted(divmod(int(np.argmin(d)), n))
+        linkage[step] = [min(cluster[i], cluster[j]), max(cluster[i], cluster[j]), d[i, j], size[i] + size[j]]
+        # Lance-Williams for average linkage: size-weighted mean of the two rows
+        merged = (size[i] * d[i] + size[j] * d[j]) / (size[i] + size[j])
+        d[i, :] = merged
+        d[:, i] = merged
+        d[j, :] = np.inf
+        d[:, j] = np.inf
+        d[i, i] = np.inf
+        size[i] += size[j]
+        cluster[i] = n + step
+    return linkage
+
+
+def leaf_order(linkage):
+    n = len(linkage) + 1
+    order, stack = [], [2 * n - 2]
+    while stack:
+        node = stack.pop()
+        if node < n:
+            order.append(node)
+        else:
+            a, b = linkage[node - n, :2].astype(int)
+            stack += [b, a]
+    return order
+
+
+def cut_clusters(linkage, n_clusters):
+    # Replay the first n - k merges; labels are numbered in leaf order
+    n = len(linkage) + 1
+    parent = list(range(2 * n - 1))
+
+    def root(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for step in range(n - max(n_clusters, 1)):
+        a, b = linkage[step, :2].astype(int)
+        parent[root(a)] = n + step
+        parent[root(b)] = n + step
+    roots = [root(leaf) for leaf in range(n)]
+    numbering = {}
+    for leaf in leaf_order(linkage):
+        numbering.setdefault(roots[leaf], len(numbering) + 1)
+    return np.array([numbering[r] for r in roots])
+
+
+@shared_cache()
+def load_series_matrix(resolution):
+    return series_matrix(resolution)
+
+
+@shared_cache()
+def load_similarity(resolution, metric):
+    normalised = load_series_matrix(resolution)
+    values = normalised.to_numpy()
+    distances = dtw_distances(values) if metric == "DTW" else correlation_distances(values)
+    linkage = average_linkage(distances)
+    return {
+        "labels": [series_label(key) for key in normalised.index],
+        "series": normalised,
+        "distances": distances,
+        "linkage": linkage,
+        "order": leaf_order(linkage),
+    }
+
+
+@shared_cache()
+def load_nearest(resolution, label, k):
+    normalised = load_series_matrix(resolution)
+    labels = [series_label(key) for key in normalised.index]
+    idx, dist, computed = nearest_series(normalised.to_numpy(), labels.index(label), k)
+    neighbours = pd.DataFrame({"Series": [labels[i] for i in idx], "DTW distance": dist.round(3)})
+    return neighbours, computed
+
+
+# === VIEW ===
+def dendrogram_figure(linkage, labels):
+    n = len(labels)
+    order = leaf_order(linkage)
+    x = {leaf: pos for pos, leaf in enumerate(order)}
+    height = {leaf: 0.0 for leaf in range(n)}
+    xs, ys = [], []
+    for step, (a, b, dist, _) in enumerate(linkage):
+        a, b = int(a), int(b)
+        xs += [x[a], x[a], x[b], x[b], None]
+        ys += [height[a], dist, dist, height[b], None]
+        x[n + step] = (x[a] + x[b]) / 2
+        height[n + step] = dist
+    fig = go.Figure(go.Scatter(x=xs, y=ys, mode="lines", line=dict(color="#4C72B0", width=1), hoverinfo="skip"))
+    fig.update_layout(
+        title="Average-linkage dendrogram", height=500, showlegend=False,
+        xaxis=dict(tickmode="array", tickvals=list(range(n)), ticktext=[labels[i] for i in order], tickangle=-60),
+        yaxis_title="Distance",
+    )
+    return fig
+
+
+def heatmap_figure(distances, labels, order):
+    ordered = [labels[i] for i in order]
+    fig = go.Figure(go.Heatmap(z=distances[np.ix_(order, order)], x=ordered, y=ordered, colorscale="Viridis_r"))
+    fig.update_layout(title="Pairwise distance (rows and columns in dendrogram order)", height=700,
+                      xaxis=dict(tickangle=-60), yaxis=dict(autorange="reversed"))
+    return fig
+
+
+def display_similarity_analysis():
+    st.markdown("Which partners and product groups reacted alike? Each trade-balance series is "
+                "z-normalised and compared by shape, then grouped by average-linkage clustering.")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        resolution = st.selectbox("Series:", SIMILARITY_RESOLUTIONS, key="similarity_resolution")
+    with col2:
+        metric = st.selectbox("Distance:", METRICS, key="similarity_metric")
+    with col3:
+        n_clusters = st.selectbox("Clusters:", list(range(2, 13)), index=DEFAULT_CLUSTERS - 2, key="similarity_clusters")
+
+    result = load_similarity(resolution, metric)
+    labels = result["labels"]
+    st.caption(f"{len(labels)} series, {len(labels) * (len(labels) - 1) // 2} pairs"
+               + (f", DTW band of {DTW_WINDOW_MONTHS} months" if metric == "DTW" else ""))
+
+    clusters = cut_clusters(result["linkage"], n_clusters)
+    st.plotly_chart(dendrogram_figure(result["linkage"], labels), use_container_width=True)
+    st.plotly_chart(heatmap_figure(result["distances"], labels, result["order"]), use_container_width=True)
+
+    st.subheader("Clusters")
+    members = pd.DataFrame({"Cluster": clusters, "Series": labels}).sort_values(["Cluster", "Series"])
+    st.dataframe(members.groupby("Cluster")["Series"].agg(", ".join).to_frame("Members"), use_container_width=True)
+
+    st.subheader("Most similar series (DTW)")
+    query = st.selectbox("Series:", labels, key="similarity_query")
+    neighbours, computed = load_nearest(resolution, query, 5)
+    st.dataframe(neighbours, use_container_width=True)
+    st.caption(f"LB_Keogh pruning: exact DTW computed for {computed} of {len(labels) - 1} candidates.")
+
+    series = result["series"]
+    shown = [labels.index(query)] + [labels.index(label) for label in neighbours["Series"]]
+    fig = go.Figure([
+        go.Scatter(x=series.columns.astype(str), y=series.iloc[i].to_numpy(), mode="lines", name=labels[i],
+                   line=dict(width=3 if i == shown[0] else 1.5))
+        for i in shown
+    ])
+    fig.update_layout(title=f"{query} and its nearest series (z-normalised)", height=450, yaxis_title="z-score")
+    st.plotly_chart(fig, use_container_width=True)
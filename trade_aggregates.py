@@ -0,0 +1,142 @@
+# trade_aggregates.py
+# Materialised quarterly, annual, trailing-12-month and year-over-year views of the monthly
+# trade-balance matrices (partners x monthly PeriodIndex, see EDA.to_monthly_index).
+#
+# Every resolution is computed once per matrix with numpy over all partners at the same time,
+# and kept in `store` next to the monthly data. When a refreshed matrix only adds months at the
+# end, just the tail is recomputed: from the January of the year containing the first new month
+# minus twelve, the earliest point any quarter, year or 12-month window touching a new month
+# can start.
+import threading
+
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = ["Monthly", "Quarterly", "Annual", "Trailing 12M", "YoY change"]
+PERIOD_FORMATS = {
+    "Monthly": "%b %Y",
+    "Quarterly": "%Y Q%q",
+    "Annual": "%Y",
+    "Trailing 12M": "12M to %b %Y",
+    "YoY change": "%b %Y",
+}
+# Quarterly and annual sums are only shown for complete periods, and the 12-month window
+# needs all twelve months, so a partly reported period never looks like a sudden drop
+PERIOD_MONTHS = {"Quarterly": 3, "Annual": 12}
+WINDOW_MONTHS = 12
+
+
+def full_months(wide):
+    # Reindex to a gap-free monthly range so window offsets are plain column offsets
+    months = pd.period_range(wide.columns.min(), wide.columns.max(), freq="M")
+    return wide.reindex(columns=months)
+
+
+def period_sums(values, periods, months_per_period):
+    # periods is sorted, so each period is a contiguous run of columns
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    present = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(present, values, 0.0), starts, axis=1)
+    counts = np.add.reduceat(present, starts, axis=1)
+    sums[counts < months_per_period] = np.nan
+    return sums, periods[starts]
+
+
+def trailing_sums(values, window):
+    present = ~np.isnan(values)
+    zeros = np.zeros((len(values), 1))
+    total = np.hstack([zeros, np.cumsum(np.where(present, values, 0.0), axis=1)])
+    count = np.hstack([zeros, np.cumsum(present, axis=1)])
+    sums = np.full(values.shape, np.nan)
+    if values.shape[1] >= window:
+        window_count = count[:, window:] - count[:, :-window]
+        window_total = total[:, window:] - total[:, :-window]
+        sums[:, window - 1:] = np.where(window_count == window, window_total, np.nan)
+    return sums
+
+
+def year_over_year(values, lag):
+    change = np.full(values.shape, np.nan)
+    change[:, lag:] = values[:, lag:] - values[:, :-lag]
+    return change
+
+
+def materialise(monthly):
+    values = monthly.to_numpy(dtype=float)
+    months = monthly.columns
+
+    views = {"Monthly": monthly}
+    for resolution, freq in (("Quarterly", "Q"), ("Annual", "Y")):
+        sums, periods = period_sums(values, months.asfreq(freq), PERIOD_MONTHS[resolution])
+        views[resolution] = pd.DataFrame(sums, index=monthly.index, columns=periods)
+    views["Trailing 12M"] = pd.DataFrame(trailing_sums(values, WINDOW_MONTHS), index=monthly.index, columns=months)
+    views["YoY change"] = pd.DataFrame(year_over_year(values, WINDOW_MONTHS), index=monthly.index, columns=months)
+    return views
+
+
+class TradeAggregates:
+    def __init__(self, wide):
+        self.source = wide
+        self.views = materialise(full_months(wide))
+
+    def frame(self, resolution):
+        return self.views[resolution]
+
+    def matches(self, wide):
+        return full_months(wide).equals(self.views["Monthly"])
+
+    def can_extend(self, wide):
+        # True if `wide` is the stored matrix with extra months appended and nothing else changed
+        old = self.views["Monthly"]
+        if not wide.index.equals(old.index) or wide.columns.min() != old.columns.min():
+            return False
+        if wide.columns.max() <= old.columns.max():
+            return False
+        overlap = full_months(wide).loc[:, :old.columns.max()]
+        return np.array_equal(overlap.to_numpy(dtype=float), old.to_numpy(dtype=float), equal_nan=True)
+
+    def extend(self, wide):
+        monthly = full_months(wide)
+        first_new = self.views["Monthly"].columns.max() + 1
+        tail_start = pd.Period(year=(first_new - WINDOW_MONTHS).year, month=1, freq="M")
+        tail = materialise(monthly.loc[:, max(tail_start, monthly.columns.min()):])
+        for resolution, view in tail.items():
+            if resolution in PERIOD_MONTHS:
+                keep_before = view.columns.min()
+            else:
+                # The first WINDOW_MONTHS columns of the tail lack history; keep the stored values
+                keep_before = first_new
+            old = self.views[resolution]
+            self.views[resolution] = pd.concat(
+                [old.loc[:, old.columns < keep_before], view.loc[:, view.columns >= keep_before]], axis=1
+            )
+        self.views["Monthly"] = monthly
+        self.source = wide
+
+
+class AggregateStore:
+    # key -> TradeAggregates, kept for the life of the process so a reload after the shared
+    # cache expires can extend the previous aggregates instead of rebuilding them
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aggregates = {}
+        self.builds = 0
+        self.extensions = 0
+
+    def refresh(self, key, wide):
+        with self._lock:
+            aggregates = self._aggregates.get(key)
+            if aggregates is not None and (aggregates.source is wide or aggregates.matches(wide)):
+                aggregates.source = wide
+                return aggregates
+            if aggregates is not None and aggregates.can_extend(wide):
+                aggregates.extend(wide)
+                self.extensions += 1
+                return aggregates
+            aggregates = TradeAggregates(wide)
+            self._aggregates[key] = aggregates
+            self.builds += 1
+            return aggregates
+
+
+store = AggregateStore()